@@ -0,0 +1,91 @@
+"""
+Latency under concurrent clients.
+
+Runs N simulated dashboard clients against a running API server, each
+looping over the endpoints the dashboard polls, and reports throughput
+and p50/p95/p99 latency per concurrency level. With blocking database
+calls every query holds the event loop, and once clients outnumber the
+connection pool the worker stalls until requests time out. With the
+async session, requests waiting on the database yield to the others.
+
+Requires httpx (pip install httpx).
+
+Usage:
+    uvicorn main:app --port 8000
+    python benchmarks/concurrency.py --url http://127.0.0.1:8000 --clients 1 10 50 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+ENDPOINTS = [
+    "/api/glucose/readings?limit=50",
+    "/api/glucose/stats",
+    "/api/glucose/crash-guard",
+    "/api/glucose/range",
+    "/api/meals/history",
+    "/api/clinician/summary/1",
+]
+
+
+def percentile(samples, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+async def client(http: httpx.AsyncClient, requests: int, latencies: list, errors: list) -> None:
+    for i in range(requests):
+        path = ENDPOINTS[i % len(ENDPOINTS)]
+        start = time.perf_counter()
+        try:
+            response = await http.get(path)
+            failed = response.status_code >= 500
+        except httpx.HTTPError:
+            failed = True  # timeouts count, a stalled server should show up
+        latencies.append((time.perf_counter() - start) * 1000)
+        if failed:
+            errors.append(path)
+
+
+async def run_level(url: str, clients: int, requests: int) -> dict:
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as http:
+        # Warm up connections and in-process caches
+        await asyncio.gather(*(http.get(path) for path in ENDPOINTS))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, requests, latencies, errors) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "errors": len(errors),
+    }
+
+
+async def main(url: str, levels, requests: int) -> None:
+    print(f"{'clients':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for clients in levels:
+        r = await run_level(url, clients, requests)
+        print(
+            f"{r['clients']:>8} {r['requests']:>9} {r['rps']:>8.0f} "
+            f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} {r['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--requests", type=int, default=30, help="requests per client")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.clients, args.requests))
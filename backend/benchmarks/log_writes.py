@@ -0,0 +1,74 @@
+"""
+Log inserts per second: one commit per request vs the write-behind queue.
+
+Simulates concurrent requests each storing one VoiceLog row, against a
+fresh SQLite file with the configured storage profile.
+
+Usage:
+    python benchmarks/log_writes.py --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Point the app's engines at a throwaway database before they are created
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='dia-pilot-bench-'), 'logs.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncSessionLocal, init_db  # noqa: E402
+from models import VoiceLog  # noqa: E402
+from services.write_behind import WriteBehindQueue  # noqa: E402
+
+
+def row(i: int) -> dict:
+    return {"transcript": f"log entry {i}", "intent": "note", "created_at": datetime.utcnow()}
+
+
+async def commit_per_request(i: int) -> None:
+    async with AsyncSessionLocal() as db:
+        db.add(VoiceLog(**row(i)))
+        await db.commit()
+
+
+async def run(name: str, store, concurrency: int, requests: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            await store(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:>18} {requests / elapsed:>10.0f}")
+
+
+async def main(concurrency: int, requests: int) -> None:
+    init_db()
+    print(f"{'mode':>18} {'rows/s':>10}")
+
+    await run("commit per request", commit_per_request, concurrency, requests)
+
+    waiting = WriteBehindQueue(mode="wait")
+    await run("write-behind wait", lambda i: waiting.submit(VoiceLog, row(i)), concurrency, requests)
+    await waiting.stop()
+
+    # Includes the final drain, so rows/s counts committed rows
+    detached = WriteBehindQueue(mode="fire_and_forget")
+    start = time.perf_counter()
+    for i in range(requests):
+        await detached.submit(VoiceLog, row(i))
+    await detached.stop()
+    print(f"{'write-behind f&f':>18} {requests / (time.perf_counter() - start):>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.requests))
@@ -6,10 +6,58 @@ load_dotenv()
 
 class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./dia_pilot.db")
+    # Replica or read-only connection for read-heavy routes; empty = primary
+    READ_DATABASE_URL: str = os.getenv("READ_DATABASE_URL", "")
+
+    # SQLite storage profile, applied to every new connection
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # readers don't block the writer
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # fsync at checkpoints only under WAL
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # bytes
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", -64000))  # pages, negative = KiB
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))  # wait for locks
+
+    # Server database (PostgreSQL) connection pool profile
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "backend/uploads")
+    IMPORT_DIR: str = os.getenv("IMPORT_DIR", "backend/imports")
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", 2000))  # readings per insert
+    IDEMPOTENCY_KEY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "backend/archive")
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))  # 0 disables archiving
+    ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", 3600))
+    # Clinician risk profiles recomputed from new readings
+    RISK_PROFILE_INTERVAL_SECONDS: int = int(os.getenv("RISK_PROFILE_INTERVAL_SECONDS", 60))
+    RISK_PROFILE_WINDOW_DAYS: int = int(os.getenv("RISK_PROFILE_WINDOW_DAYS", 14))  # avg, TIR and risk window
+    RISK_TREND_WINDOW_MINUTES: int = int(os.getenv("RISK_TREND_WINDOW_MINUTES", 60))  # trend slope window
+    RISK_PROFILE_BATCH_SIZE: int = int(os.getenv("RISK_PROFILE_BATCH_SIZE", 500))  # profiles per UPDATE batch
+    # Clinician cohort forecasts
+    FORECAST_MAX_PATIENTS: int = int(os.getenv("FORECAST_MAX_PATIENTS", 10000))  # patients per forecast page
+    # Group commit for voice/meal/diagnosis log inserts
+    WRITE_BEHIND_MAX_BATCH: int = int(os.getenv("WRITE_BEHIND_MAX_BATCH", 200))  # rows per commit
+    WRITE_BEHIND_MAX_DELAY_MS: int = int(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", 10))  # max wait to fill a batch
+    WRITE_BEHIND_MODE: str = os.getenv("WRITE_BEHIND_MODE", "wait")  # wait (durable ack) or fire_and_forget
+    # Dashboard response cache: memory (per process), redis (shared) or off
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_URL: str = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", 4096))  # entries (memory backend)
+    RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 60))
     MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))  # 10MB
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".webp"}
+    MAX_BATCH_SIZE: int = int(os.getenv("MAX_BATCH_SIZE", 5000))  # readings per ingest batch
+    MAX_PAGE_SIZE: int = int(os.getenv("MAX_PAGE_SIZE", 500))  # rows per history page
     
+    def sqlite_pragmas(self) -> dict:
+        """PRAGMA name -> value for the SQLite storage profile."""
+        return {
+            "journal_mode": self.SQLITE_JOURNAL_MODE,
+            "synchronous": self.SQLITE_SYNCHRONOUS,
+            "mmap_size": self.SQLITE_MMAP_SIZE,
+            "cache_size": self.SQLITE_CACHE_SIZE,
+            "busy_timeout": self.SQLITE_BUSY_TIMEOUT_MS,
+        }
+
     # CORS origins
     CORS_ORIGINS: list = [
         "http://localhost:5173",
@@ -20,5 +68,6 @@ class Settings:
 
 settings = Settings()
 
-# Ensure upload directory exists
+# Ensure upload directories exist
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+os.makedirs(settings.IMPORT_DIR, exist_ok=True)
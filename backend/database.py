@@ -1,35 +1,215 @@
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateIndex
 from config import settings
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
+# Async drivers used by the request path, by backend
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap a database URL's driver for its asyncio counterpart."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def _json_dumps(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+def engine_options(url: str) -> dict:
+    """Engine arguments for the storage profile matching a database URL."""
+    # JSON columns are (de)serialized with orjson
+    options = {"json_serializer": _json_dumps, "json_deserializer": orjson.loads}
+    if make_url(url).get_backend_name() == "sqlite":
+        return {**options, "connect_args": {"check_same_thread": False}}
+    return {
+        **options,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(sync_engine, pragmas: dict) -> None:
+    """Run the given PRAGMAs on every new connection of a SQLite engine."""
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+# Sync engine: startup, scripts and worker threads (import, archive)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+apply_sqlite_pragmas(engine, settings.sqlite_pragmas())
+
+# Async engine: request handlers, so queries never block the event loop
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL), **engine_options(settings.DATABASE_URL)
 )
+apply_sqlite_pragmas(async_engine.sync_engine, settings.sqlite_pragmas())
+
+# Read engines: a replica when READ_DATABASE_URL is set, else the primary
+if settings.READ_DATABASE_URL:
+    read_engine = create_engine(settings.READ_DATABASE_URL, **engine_options(settings.READ_DATABASE_URL))
+    apply_sqlite_pragmas(read_engine, settings.sqlite_pragmas())
+    read_async_engine = create_async_engine(
+        async_database_url(settings.READ_DATABASE_URL), **engine_options(settings.READ_DATABASE_URL)
+    )
+    apply_sqlite_pragmas(read_async_engine.sync_engine, settings.sqlite_pragmas())
+else:
+    read_engine, read_async_engine = engine, async_engine
+
+
+class ReadOnlySession(Session):
+    """Session for replica reads; refuses to flush pending writes."""
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Writes must go through get_db, not the read-only session")
+        super().flush(objects)
+
 
-# Create session factory
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, class_=ReadOnlySession)
+# Objects stay readable after commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(
+    read_async_engine, autoflush=False, expire_on_commit=False, sync_session_class=ReadOnlySession
+)
 
 # Base class for models
 Base = declarative_base()
 
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+# Dependency to get database session (primary: writes and read-your-writes)
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependency to get a read-only session (replica, may lag the primary)
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # Initialize database
 def init_db():
+    import models  # noqa: F401  (registers the tables on Base)
+
     Base.metadata.create_all(bind=engine)
+    _drop_duplicate_readings()
+    _enable_reading_autoincrement()
+    # create_all skips indexes on tables that already exist; IF NOT EXISTS
+    # also covers expression indexes, which reflection cannot see
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _drop_duplicate_readings():
+    """
+    Remove readings that repeat (user_id, timestamp, source) so the
+    natural-key unique index can be created on databases from before it.
+    The earliest row is kept; rollups are cleared and rebuilt on startup.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("glucose_readings"):
+        return
+    existing = {ix["name"] for ix in inspector.get_indexes("glucose_readings")}
+    if "ux_glucose_readings_natural_key" in existing:
+        return
+
+    with engine.begin() as conn:
+        removed = conn.execute(text(
+            "DELETE FROM glucose_readings WHERE id NOT IN ("
+            "SELECT MIN(id) FROM glucose_readings GROUP BY user_id, timestamp, source)"
+        )).rowcount
+        if removed:
+            conn.execute(text("DELETE FROM glucose_rollups"))
+            print(f"Removed {removed} duplicate glucose readings")
+
+
+def _enable_reading_autoincrement():
+    """
+    Rebuild glucose_readings with AUTOINCREMENT on SQLite databases from
+    before it. Without it SQLite reuses the highest ids once they are
+    archived (deleted), so ids would repeat between hot rows and archive
+    segments. The sequence is started past the highest hot or archived id.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect() as conn:
+        ddl = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'glucose_readings'"
+        )).scalar()
+    if ddl is None or "AUTOINCREMENT" in ddl.upper():
+        return
+
+    from services.glucose_archive import glucose_archive
+
+    table = Base.metadata.tables["glucose_readings"]
+    columns = ", ".join(column.name for column in table.c)
+    with engine.begin() as conn:
+        old_indexes = conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'glucose_readings' AND sql IS NOT NULL"
+        )).scalars().all()
+        conn.execute(text("ALTER TABLE glucose_readings RENAME TO glucose_readings_old"))
+        for name in old_indexes:
+            conn.execute(text(f'DROP INDEX "{name}"'))
+        table.create(conn)
+        conn.execute(text(
+            f"INSERT INTO glucose_readings ({columns}) SELECT {columns} FROM glucose_readings_old"
+        ))
+        conn.execute(text("DROP TABLE glucose_readings_old"))
+
+        high_water = max(
+            conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM glucose_readings")).scalar(),
+            glucose_archive.max_id()
+        )
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'glucose_readings'"))
+        conn.execute(
+            text("INSERT INTO sqlite_sequence (name, seq) VALUES ('glucose_readings', :seq)"),
+            {"seq": high_water}
+        )
+    print(f"Rebuilt glucose_readings with AUTOINCREMENT (next id {high_water + 1})")
+
+
+def explain_query_plan(db, query) -> list:
+    """
+    Return SQLite's EXPLAIN QUERY PLAN detail lines for a select() statement.
+    """
+    compiled = query.compile(dialect=db.bind.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in (compiled.positiontup or []))
+    rows = db.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {compiled}", params
+    ).fetchall()
+    return [row[-1] for row in rows]
 
 
 if __name__ == "__main__":
+    # Models register on the importable module's Base, not on __main__'s
+    from database import init_db
+
     print("Initializing database...")
     init_db()
     print("Database initialized successfully!")
@@ -0,0 +1,50 @@
+"""
+Conditional GET (ETag / If-None-Match) helpers.
+
+ETags are derived from a cheap version of the resource (the newest row's
+timestamp and id, a profile's updated_at) together with the request's
+query parameters, so an unchanged resource is answered with 304 before
+its page is loaded or serialized.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Per-user data: clients may keep it but must revalidate before reuse
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag over the parts identifying one version of a response."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Answer a conditional GET.
+
+    Args:
+        request: Incoming request (If-None-Match is read from it)
+        response: Response the route is building (tagged with the ETag)
+        etag: Current ETag of the resource
+
+    Returns:
+        An empty 304 response if the client's copy is current, otherwise
+        None after setting the ETag header on response
+    """
+    header = request.headers.get("if-none-match")
+    if header:
+        # If-None-Match uses the weak comparison
+        tags = {_opaque(tag) for tag in header.split(",")}
+        if "*" in tags or _opaque(etag) in tags:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return None
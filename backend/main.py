@@ -1,10 +1,12 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 
 from config import settings
-from database import init_db
+from database import init_db, SessionLocal
 from routes.meals import router as meals_router
 from routes.glucose import router as glucose_router
 from routes.predictions import router as predictions_router
@@ -12,12 +14,21 @@ from routes.voice import router as voice_router
 from routes.behavioral import router as behavioral_router
 from routes.clinician import router as clinician_router
 from routes.health import router as health_router
+from routes.export import router as export_router
+from services.glucose_predictor import glucose_predictor
+from services.glucose_rollups import glucose_rollups
+from services.glucose_stats import glucose_stats
+from services.glucose_archive import glucose_archive
+from services.idempotency import idempotency_store
+from services.risk_profiles import risk_profiles
+from services.write_behind import write_behind
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Dia-Pilot API",
     description="Backend API for Dia-Pilot diabetes management platform",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -37,6 +48,7 @@ app.include_router(voice_router)
 app.include_router(behavioral_router)
 app.include_router(clinician_router)
 app.include_router(health_router)
+app.include_router(export_router)
 
 # Serve uploaded files
 if os.path.exists(settings.UPLOAD_DIR):
@@ -49,6 +61,71 @@ async def startup_event():
     init_db()
     print("Database initialized!")
 
+    db = SessionLocal()
+    try:
+        backfilled = glucose_rollups.rebuild_if_missing(db)
+        forecasts_backfilled = glucose_predictor.rebuild_states_if_missing(db)
+        glucose_stats.rebuild(db)
+        idempotency_store.purge_expired(db)
+    finally:
+        db.close()
+    if backfilled:
+        print(f"Glucose rollups rebuilt from {backfilled} readings")
+    if forecasts_backfilled:
+        print(f"Glucose forecast states rebuilt from {forecasts_backfilled} readings")
+
+    write_behind.start()
+
+    if settings.ARCHIVE_AFTER_DAYS > 0:
+        asyncio.create_task(archive_old_readings())
+    asyncio.create_task(refresh_risk_profiles())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued log writes before exiting"""
+    await write_behind.stop()
+
+
+def run_archive() -> int:
+    """Move readings past ARCHIVE_AFTER_DAYS into the cold archive."""
+    db = SessionLocal()
+    try:
+        return glucose_archive.run(db)
+    finally:
+        db.close()
+
+
+async def archive_old_readings():
+    """Periodically archive old readings without blocking the event loop."""
+    while True:
+        try:
+            moved = await asyncio.to_thread(run_archive)
+            if moved:
+                print(f"Archived {moved} glucose readings")
+        except Exception as e:
+            print(f"Error archiving glucose readings: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+
+
+def run_risk_profiles() -> int:
+    """Recompute clinician risk profiles of patients with new readings."""
+    db = SessionLocal()
+    try:
+        return risk_profiles.run(db)
+    finally:
+        db.close()
+
+
+async def refresh_risk_profiles():
+    """Periodically refresh risk profiles without blocking the event loop."""
+    while True:
+        try:
+            await asyncio.to_thread(run_risk_profiles)
+        except Exception as e:
+            print(f"Error updating risk profiles: {e}")
+        await asyncio.sleep(settings.RISK_PROFILE_INTERVAL_SECONDS)
+
 
 @app.get("/")
 async def root():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Index, JSON, case, literal_column
 from datetime import datetime
 from database import Base
 
@@ -15,6 +15,10 @@ class MealLog(Base):
     notes = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_meal_logs_user_created", user_id, created_at.desc(), id.desc()),
+    )
+
     def __repr__(self):
         return f"<MealLog(id={self.id}, carbs={self.carbs_estimate}g, created={self.created_at})>"
 
@@ -29,10 +33,95 @@ class GlucoseReading(Base):
     source = Column(String, default="manual")  # manual, cgm, etc.
     notes = Column(String, nullable=True)
 
+    __table_args__ = (
+        # Per-patient "latest first" scans and (timestamp, id) keyset pages;
+        # value is included so value-only queries are answered from the index
+        Index("ix_glucose_readings_user_timestamp", user_id, timestamp.desc(), id.desc(), value),
+        # Natural key: a re-sent reading is a no-op instead of a new row
+        Index("ux_glucose_readings_natural_key", user_id, timestamp, source, unique=True),
+        # Ids of archived (deleted) readings must never be handed out again
+        {"sqlite_autoincrement": True},
+    )
+
     def __repr__(self):
         return f"<GlucoseReading(id={self.id}, value={self.value}, time={self.timestamp})>"
 
 
+class GlucoseRollup(Base):
+    __tablename__ = "glucose_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    resolution = Column(Integer, nullable=False)  # bucket width in seconds (300, 3600, 86400)
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, default=0)
+    total = Column(Float, default=0.0)  # sum of values
+    total_sq = Column(Float, default=0.0)  # sum of squared values
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+    hypo_count = Column(Integer, default=0)  # < 70 mg/dL
+    in_range_count = Column(Integer, default=0)  # 70-180 mg/dL
+    hyper_count = Column(Integer, default=0)  # > 180 mg/dL
+
+    __table_args__ = (
+        Index("ux_glucose_rollups_bucket", user_id, resolution, bucket_start, unique=True),
+    )
+
+    def __repr__(self):
+        return f"<GlucoseRollup(user_id={self.user_id}, res={self.resolution}s, start={self.bucket_start}, n={self.count})>"
+
+
+class GlucoseForecastState(Base):
+    __tablename__ = "glucose_forecast_states"
+
+    # One row per patient: the level + trend Kalman filter behind forecasts
+    user_id = Column(Integer, primary_key=True)
+    level = Column(Float, nullable=False)  # filtered glucose at last_time (mg/dL)
+    trend = Column(Float, nullable=False)  # mg/dL per minute
+    var_level = Column(Float, nullable=False)  # state covariance
+    cov_level_trend = Column(Float, nullable=False)
+    var_trend = Column(Float, nullable=False)
+    last_time = Column(DateTime, nullable=False)  # newest reading folded in
+    last_value = Column(Float, nullable=False)  # its raw value
+
+    def __repr__(self):
+        return f"<GlucoseForecastState(user_id={self.user_id}, level={self.level:.1f}, trend={self.trend:+.2f})>"
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, default=1)
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)  # spooled upload
+    status = Column(String, default="queued")  # queued, running, completed, failed
+    bytes_total = Column(Integer, default=0)
+    bytes_processed = Column(Integer, default=0)
+    rows_imported = Column(Integer, default=0)
+    rows_rejected = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ImportJob(id={self.id}, status={self.status}, imported={self.rows_imported})>"
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)  # endpoint path
+    request_hash = Column(String, nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key={self.key}, scope={self.scope})>"
+
+
 class VoiceLog(Base):
     __tablename__ = "voice_logs"
 
@@ -43,6 +132,10 @@ class VoiceLog(Base):
     extracted_data = Column(Text, nullable=True)  # JSON string
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_voice_logs_user_created", user_id, created_at.desc(), id.desc()),
+    )
+
     def __repr__(self):
         return f"<VoiceLog(id={self.id}, intent={self.intent})>"
 
@@ -63,6 +156,22 @@ class CoachingNudge(Base):
         return f"<CoachingNudge(id={self.id}, title={self.title})>"
 
 
+# Triage order of risk levels; unknown levels sort last
+RISK_RANKS = {"high": 0, "medium": 1, "low": 2}
+
+
+def risk_rank(risk_level):
+    """
+    CASE expression mapping a risk level to its triage rank.
+    Values are inlined as literals so queries match the expression index.
+    """
+    return case(
+        *[(risk_level == literal_column(f"'{level}'"), literal_column(str(rank)))
+          for level, rank in RISK_RANKS.items()],
+        else_=literal_column(str(len(RISK_RANKS)))
+    )
+
+
 class PatientRiskProfile(Base):
     __tablename__ = "patient_risk_profiles"
 
@@ -77,6 +186,11 @@ class PatientRiskProfile(Base):
     trend = Column(String, default="stable")  # rising, falling, stable
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Triage list order: highest risk first, then by id
+        Index("ix_patient_risk_profiles_triage", risk_rank(risk_level), id),
+    )
+
     def __repr__(self):
         return f"<PatientRiskProfile(id={self.id}, name={self.name}, risk={self.risk_level})>"
 
@@ -131,18 +245,22 @@ class DiagnosisRecord(Base):
     # Analysis results
     overall_health_score = Column(Float, nullable=False)  # 0-100
     risk_level = Column(String, nullable=False)  # low, moderate, high, critical
-    key_concerns = Column(Text, nullable=False)  # JSON array
-    positive_factors = Column(Text, nullable=True)  # JSON array
+    key_concerns = Column(JSON, nullable=False)  # list of str
+    positive_factors = Column(JSON, nullable=True)  # list of str
     
     # Predictions
-    predicted_complications = Column(Text, nullable=True)  # JSON array
+    predicted_complications = Column(JSON, nullable=True)  # list of str
     time_horizon = Column(String, default="6 months")
     
     # Recommendations
-    recommendations = Column(Text, nullable=False)  # JSON array with priority
-    action_items = Column(Text, nullable=True)  # JSON array
+    recommendations = Column(JSON, nullable=False)  # list of dicts with priority
+    action_items = Column(JSON, nullable=True)  # list of str
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_diagnosis_records_user_created", user_id, created_at.desc(), id.desc()),
+    )
+
     def __repr__(self):
         return f"<DiagnosisRecord(id={self.id}, score={self.overall_health_score}, risk={self.risk_level})>"
@@ -0,0 +1,136 @@
+"""
+Keyset (cursor) pagination helpers.
+
+History pages are ordered newest first on (timestamp, id); ranked lists
+such as clinician triage are ordered on (rank, id). The cursor is an opaque
+token encoding the last row of the previous page, so every page is an index
+seek no matter how deep it is.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+
+
+def _encode(key: list) -> str:
+    raw = json.dumps(key).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    return json.loads(raw)
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Build an opaque cursor pointing just past (timestamp, id)."""
+    return _encode([timestamp.isoformat(), row_id])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor produced by encode_cursor."""
+    try:
+        timestamp, row_id = _decode(cursor)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_rank_cursor(rank: int, row_id: int) -> str:
+    """Build an opaque cursor pointing just past (rank, id)."""
+    return _encode(["rank", rank, row_id])
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[int, int]:
+    """Parse a cursor produced by encode_rank_cursor."""
+    try:
+        tag, rank, row_id = _decode(cursor)
+        if tag != "rank":
+            raise ValueError(tag)
+        return int(rank), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_size(limit: int) -> int:
+    """Clamp a requested page size to [1, MAX_PAGE_SIZE]."""
+    return max(1, min(limit, settings.MAX_PAGE_SIZE))
+
+
+def keyset_query(query, timestamp_col, id_col, cursor: Optional[str], limit: int):
+    """
+    Restrict a query to one page, newest first.
+
+    Args:
+        query: select() statement already filtered to the caller's rows
+        timestamp_col: Column holding the row time
+        id_col: Primary key column (tie-breaker)
+        cursor: Cursor from the previous page, or None for the first page
+        limit: Page size (already clamped)
+
+    Returns:
+        Query fetching limit + 1 rows (the extra row signals another page)
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        # The leading range on timestamp keeps this an index seek
+        query = query.where(
+            timestamp_col <= timestamp,
+            or_(timestamp_col < timestamp, and_(timestamp_col == timestamp, id_col < row_id))
+        )
+
+    return query.order_by(timestamp_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+async def keyset_page(db: AsyncSession, query, timestamp_col, id_col, cursor: Optional[str],
+                      limit: int) -> Tuple[List, Optional[str]]:
+    """
+    Fetch one page of a query, newest first.
+
+    Returns:
+        Tuple of (rows, next_cursor); rows are ORM objects for an entity
+        query and Row tuples for a column query. next_cursor is None on
+        the last page
+    """
+    limit = page_size(limit)
+    result = await db.execute(keyset_query(query, timestamp_col, id_col, cursor, limit))
+    first = query.column_descriptions[0]
+    rows = (result.scalars() if first["expr"] is first["entity"] else result).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, timestamp_col.key), getattr(last, id_col.key))
+
+    return rows, next_cursor
+
+
+def rank_keyset_query(query, rank_expr, id_col, cursor: Optional[str], limit: int):
+    """
+    Restrict a query to one page, lowest rank first.
+
+    Args:
+        query: select() statement already filtered to the caller's rows
+        rank_expr: Rank expression (leading column of the ordering index)
+        id_col: Primary key column (tie-breaker)
+        cursor: Cursor from the previous page, or None for the first page
+        limit: Page size (already clamped)
+
+    Returns:
+        Query fetching limit + 1 rows (the extra row signals another page)
+    """
+    if cursor:
+        rank, row_id = decode_rank_cursor(cursor)
+        query = query.where(
+            rank_expr >= rank,
+            or_(rank_expr > rank, and_(rank_expr == rank, id_col > row_id))
+        )
+
+    return query.order_by(rank_expr, id_col).limit(limit + 1)
@@ -0,0 +1,147 @@
+"""
+Shared per-patient glucose queries and the clinician triage query.
+
+Every glucose query here is scoped to one patient and ordered by timestamp
+so it can be served by the (user_id, timestamp DESC, id DESC) index on
+glucose_readings; the triage query is ordered on the (risk rank, id)
+expression index on patient_risk_profiles. They are plain select()
+statements, so the same query runs on the async request session and on
+sync worker sessions.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from models import GlucoseReading, GlucoseRollup, PatientRiskProfile, RISK_RANKS, risk_rank
+
+GLUCOSE_INDEX = "ix_glucose_readings_user_timestamp"
+TRIAGE_INDEX = "ix_patient_risk_profiles_triage"
+
+# Columns of a PatientRiskProfileResponse, in response order
+TRIAGE_COLUMNS = [
+    PatientRiskProfile.id,
+    PatientRiskProfile.user_id,
+    PatientRiskProfile.name,
+    PatientRiskProfile.age,
+    PatientRiskProfile.risk_level,
+    PatientRiskProfile.avg_glucose,
+    PatientRiskProfile.time_in_range,
+    PatientRiskProfile.last_reading_time,
+    PatientRiskProfile.trend,
+]
+
+
+def readings_query(user_id: int):
+    """A patient's full readings, unordered (callers page with keyset_query)."""
+    return select(GlucoseReading).where(GlucoseReading.user_id == user_id)
+
+
+def latest_values(user_id: int, limit: int):
+    """Most recent (timestamp, value) pairs for a patient, newest first."""
+    return select(GlucoseReading.timestamp, GlucoseReading.value).where(
+        GlucoseReading.user_id == user_id
+    ).order_by(
+        GlucoseReading.timestamp.desc()
+    ).limit(limit)
+
+
+def newest_reading(user_id: int):
+    """The patient's newest (timestamp, id), for ETags."""
+    return select(GlucoseReading.timestamp, GlucoseReading.id).where(
+        GlucoseReading.user_id == user_id
+    ).order_by(
+        GlucoseReading.timestamp.desc(), GlucoseReading.id.desc()
+    ).limit(1)
+
+
+def reading_count(user_id: int):
+    """
+    Readings ever stored for a patient, hot and archived, summed from the
+    daily rollups. Unlike the newest reading it also changes on backfills.
+    """
+    from services.glucose_rollups import DAILY
+
+    return select(func.coalesce(func.sum(GlucoseRollup.count), 0)).where(
+        GlucoseRollup.user_id == user_id,
+        GlucoseRollup.resolution == DAILY
+    )
+
+
+def triage_query(risk_levels: Optional[List[str]] = None, trend: Optional[str] = None,
+                 stale_before: Optional[datetime] = None):
+    """
+    Filtered triage rows, unordered (callers page with rank_keyset_query).
+
+    Args:
+        risk_levels: Only these risk levels (a range seek on the rank index)
+        trend: Only this glucose trend
+        stale_before: Only patients whose last reading is older than this,
+            or who have none
+    """
+    query = select(*TRIAGE_COLUMNS)
+    if risk_levels:
+        # A range rather than = or IN, which SQLite would follow with a
+        # sort instead of reading the index in order
+        ranks = [RISK_RANKS[level] for level in risk_levels]
+        query = query.where(risk_rank(PatientRiskProfile.risk_level).between(min(ranks), max(ranks)))
+        if len(set(ranks)) < max(ranks) - min(ranks) + 1:
+            query = query.where(PatientRiskProfile.risk_level.in_(risk_levels))
+    if trend:
+        query = query.where(PatientRiskProfile.trend == trend)
+    if stale_before:
+        query = query.where(or_(
+            PatientRiskProfile.last_reading_time.is_(None),
+            PatientRiskProfile.last_reading_time < stale_before
+        ))
+    return query
+
+
+def check_index_usage(db: Session, user_id: int = 1) -> dict:
+    """
+    Run EXPLAIN QUERY PLAN for each dashboard query (tests/test_queries.py).
+
+    Returns:
+        Dict of query name -> (uses_index, plan lines)
+    """
+    from database import explain_query_plan
+    from pagination import encode_cursor, encode_rank_cursor, keyset_query, rank_keyset_query
+    from services.risk_profiles import TREND_MAX_READINGS
+
+    cursor = encode_cursor(datetime.utcnow(), 2 ** 31)
+    rank = risk_rank(PatientRiskProfile.risk_level)
+    queries = {
+        "readings": keyset_query(
+            readings_query(user_id), GlucoseReading.timestamp, GlucoseReading.id, None, 20
+        ),
+        "readings_page": keyset_query(
+            readings_query(user_id), GlucoseReading.timestamp, GlucoseReading.id, cursor, 20
+        ),
+        "stats_current": latest_values(user_id, 1),
+        "coaching": latest_values(user_id, 10),
+        "risk_trend": latest_values(user_id, TREND_MAX_READINGS),
+        "etag": newest_reading(user_id),
+    }
+    triage_queries = {
+        "triage": rank_keyset_query(triage_query(), rank, PatientRiskProfile.id, None, 50),
+        "triage_page": rank_keyset_query(
+            triage_query(), rank, PatientRiskProfile.id, encode_rank_cursor(1, 0), 50
+        ),
+        "triage_high": rank_keyset_query(triage_query(["high"]), rank, PatientRiskProfile.id, None, 50),
+        "triage_filtered": rank_keyset_query(
+            triage_query(["high", "medium"], "rising", datetime.utcnow()), rank, PatientRiskProfile.id, None, 50
+        ),
+    }
+
+    results = {}
+    for name, query in [*queries.items(), *triage_queries.items()]:
+        index = TRIAGE_INDEX if name in triage_queries else GLUCOSE_INDEX
+        plan = explain_query_plan(db, query)
+        uses_index = (
+            any(index in line for line in plan)
+            and not any("USE TEMP B-TREE" in line for line in plan)
+        )
+        results[name] = (uses_index, plan)
+    return results
+
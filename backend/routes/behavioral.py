@@ -1,24 +1,27 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from database import get_db
-from models import GlucoseReading
+from database import get_read_db
+from queries import latest_values
 from schemas import CoachingNudgeResponse, GlucoseTwinResponse
 from services.behavioral_coach import behavioral_coach
+from services.response_cache import response_cache
 
 router = APIRouter(prefix="/api/behavioral", tags=["behavioral"])
 
 
 @router.get("/coaching", response_model=List[CoachingNudgeResponse])
-async def get_coaching_nudges(db: Session = Depends(get_db)):
+@response_cache.cached("behavioral:coaching")
+async def get_coaching_nudges(
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Get personalized coaching nudges based on user patterns.
     """
     # Get recent glucose data
-    readings = db.query(GlucoseReading).order_by(
-        GlucoseReading.timestamp.desc()
-    ).limit(10).all()
+    readings = (await db.execute(latest_values(user_id, 10))).all()
     
     values = [r.value for r in readings] if readings else None
     
@@ -1,26 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from datetime import datetime, timedelta
 import random
 
-from database import get_db
-from models import PatientRiskProfile, GlucoseReading
-from schemas import PatientRiskProfileResponse, ExecutiveSummaryResponse
+import numpy as np
+
+from config import settings
+from database import get_db, get_read_db
+from models import GlucoseForecastState, PatientRiskProfile, risk_rank
+from pagination import page_size, rank_keyset_query, encode_rank_cursor
+from queries import triage_query
+from services.glucose_predictor import RESET_GAP_MINUTES, glucose_predictor
+from services.glucose_rollups import glucose_rollups
+from services.response_cache import PANEL, response_cache
+from schemas import TriagePage, ExecutiveSummaryResponse, SummaryPage, ForecastPage
 
 router = APIRouter(prefix="/api/clinician", tags=["clinician"])
 
 
-@router.get("/triage", response_model=List[PatientRiskProfileResponse])
-async def get_patient_triage(db: Session = Depends(get_db)):
+async def _triage_page(db: AsyncSession, query, cursor: Optional[str], limit: int):
+    """Fetch one triage page in (risk rank, id) order."""
+    rank = risk_rank(PatientRiskProfile.risk_level)
+    rows = (await db.execute(
+        rank_keyset_query(query.add_columns(rank), rank, PatientRiskProfile.id, cursor, limit)
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_rank_cursor(rows[-1][-1], rows[-1].id)
+
+    # The trailing rank column is only needed for the cursor
+    keys = list(rows[0]._fields[:-1]) if rows else []
+    return [dict(zip(keys, row)) for row in rows], next_cursor
+
+
+@router.get("/triage", response_model=TriagePage)
+@response_cache.cached(
+    "clinician:triage", scope=PANEL, params=("risk_level", "trend", "stale_minutes", "limit", "cursor")
+)
+async def get_patient_triage(
+    risk_level: Optional[List[Literal["high", "medium", "low"]]] = Query(None),
+    trend: Optional[Literal["rising", "falling", "stable"]] = None,
+    stale_minutes: Optional[int] = Query(None, ge=1),
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    read_db: AsyncSession = Depends(get_read_db),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Get patient triage list sorted by risk level.
+    Get patient triage list, highest risk first.
+    Filter with risk_level (repeatable), trend, and stale_minutes (no
+    reading in that many minutes). Pass the returned next_cursor to fetch
+    the following page.
     """
-    # Get or create patient profiles
-    profiles = db.query(PatientRiskProfile).all()
+    limit = page_size(limit)
+    stale_before = datetime.utcnow() - timedelta(minutes=stale_minutes) if stale_minutes else None
+    query = triage_query(risk_level, trend, stale_before)
+    items, next_cursor = await _triage_page(read_db, query, cursor, limit)
     
-    if not profiles:
-        # Create mock patient profiles
+    if not items and not cursor and not (risk_level or trend or stale_minutes):
+        # Create mock patient profiles (on the primary, then read back from it)
         mock_patients = [
             {"user_id": 1, "name": "Sarah Johnson", "age": 34, "risk_level": "low", "avg_glucose": 112.0, "trend": "stable"},
             {"user_id": 2, "name": "Michael Chen", "age": 52, "risk_level": "high", "avg_glucose": 178.0, "trend": "rising"},
@@ -37,62 +80,201 @@ async def get_patient_triage(db: Session = Depends(get_db)):
             )
             db.add(profile)
         
-        db.commit()
-        profiles = db.query(PatientRiskProfile).all()
-    
-    # Sort by risk level (high, medium, low)
-    risk_order = {"high": 0, "medium": 1, "low": 2}
-    profiles.sort(key=lambda p: risk_order.get(p.risk_level, 999))
+        await db.commit()
+        response_cache.invalidate([PANEL])
+        items, next_cursor = await _triage_page(db, query, None, limit)
     
-    return profiles
+    # Rows are serialized directly rather than re-validated
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
 
 
 @router.get("/summary/{patient_id}", response_model=ExecutiveSummaryResponse)
 async def get_executive_summary(
     patient_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get executive summary for a specific patient.
     """
     # Get patient profile
-    profile = db.query(PatientRiskProfile).filter(
-        PatientRiskProfile.user_id == patient_id
-    ).first()
+    profile = await db.scalar(
+        select(PatientRiskProfile).where(PatientRiskProfile.user_id == patient_id)
+    )
     
     if not profile:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    # Get patient's glucose readings from last 30 days
+    # Aggregate the patient's last 30 days from daily/hourly rollups
     since = datetime.utcnow() - timedelta(days=30)
-    readings = db.query(GlucoseReading).filter(
-        GlucoseReading.user_id == patient_id,
-        GlucoseReading.timestamp >= since
-    ).all()
+    stats = await db.run_sync(glucose_rollups.window_stats, patient_id, since)
     
     # Calculate metrics
-    if readings:
-        values = [r.value for r in readings]
-        avg_glucose = sum(values) / len(values)
-        
-        # Time in range
-        in_range = [v for v in values if 70 <= v <= 180]
-        time_in_range = (len(in_range) / len(values)) * 100
-        
-        # Count events
-        hypo_events = len([v for v in values if v < 70])
-        hyper_events = len([v for v in values if v > 180])
-        
+    if stats:
+        avg_glucose = stats["mean"]
+        time_in_range = stats["time_in_range"]
+        hypo_events = stats["hypo_events"]
+        hyper_events = stats["hyper_events"]
         trend = profile.trend
     else:
-        # Use profile defaults
+        # No readings in the window: fall back to the profile (as /summaries does)
         avg_glucose = profile.avg_glucose or 110.0
         time_in_range = profile.time_in_range or 85.0
-        hypo_events = random.randint(0, 3)
-        hyper_events = random.randint(1, 5)
+        hypo_events = hyper_events = 0
         trend = profile.trend
     
-    # Generate key insights
+    return ExecutiveSummaryResponse(
+        patient_name=profile.name,
+        avg_glucose=round(avg_glucose, 1),
+        time_in_range=round(time_in_range, 1),
+        hypo_events=hypo_events,
+        hyper_events=hyper_events,
+        trend=trend,
+        key_insights=_key_insights(avg_glucose, time_in_range, hypo_events, trend)
+    )
+
+
+@router.get("/summaries", response_model=SummaryPage)
+async def get_executive_summaries(
+    patient_id: Optional[List[int]] = Query(None),
+    risk_level: Optional[List[Literal["high", "medium", "low"]]] = Query(None),
+    trend: Optional[Literal["rising", "falling", "stable"]] = None,
+    stale_minutes: Optional[int] = Query(None, ge=1),
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get executive summaries for many patients in one grouped query.
+    Select patients with patient_id (repeatable) and/or the triage filters;
+    results come in triage order and page with next_cursor like /triage.
+    """
+    limit = page_size(limit)
+    stale_before = datetime.utcnow() - timedelta(minutes=stale_minutes) if stale_minutes else None
+    query = triage_query(risk_level, trend, stale_before)
+    if patient_id:
+        query = query.where(PatientRiskProfile.user_id.in_(patient_id))
+    
+    # One page of profiles, joined to their last 30 days of rollups
+    rank = risk_rank(PatientRiskProfile.risk_level)
+    page = rank_keyset_query(
+        query.add_columns(rank.label("rank")), rank, PatientRiskProfile.id, cursor, limit
+    ).subquery()
+    since = datetime.utcnow() - timedelta(days=30)
+    rows = (await db.execute(
+        glucose_rollups.join_window(
+            select(page, *glucose_rollups.window_sums()).select_from(page), page.c.user_id, since
+        )
+        .group_by(*page.c)
+        .order_by(page.c.rank, page.c.id)
+    )).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_rank_cursor(rows[-1].rank, rows[-1].id)
+    
+    items = []
+    for row in rows:
+        sums = row[len(page.c):]
+        if sums[0]:
+            stats = glucose_rollups.summarize(*sums)
+            avg_glucose = stats["mean"]
+            time_in_range = stats["time_in_range"]
+            hypo_events = stats["hypo_events"]
+            hyper_events = stats["hyper_events"]
+        else:
+            # No readings in the window: fall back to the profile
+            avg_glucose = row.avg_glucose or 110.0
+            time_in_range = row.time_in_range or 85.0
+            hypo_events = hyper_events = 0
+        
+        items.append({
+            "patient_id": row.user_id,
+            "patient_name": row.name,
+            "risk_level": row.risk_level,
+            "avg_glucose": round(avg_glucose, 1),
+            "time_in_range": round(time_in_range, 1),
+            "hypo_events": hypo_events,
+            "hyper_events": hyper_events,
+            "trend": row.trend,
+            "key_insights": _key_insights(avg_glucose, time_in_range, hypo_events, row.trend),
+        })
+    
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+
+# Not response-cached: every ingest moves a patient's forecast, and
+# invalidating the panel per reading would also defeat the triage cache
+@router.get("/forecasts", response_model=ForecastPage)
+async def get_cohort_forecasts(
+    risk_level: Optional[List[Literal["high", "medium", "low"]]] = Query(None),
+    trend: Optional[Literal["rising", "falling", "stable"]] = None,
+    stale_minutes: Optional[int] = Query(None, ge=1),
+    hours: int = Query(3, ge=1, le=12),
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Forecast glucose for the triage list in one vectorized pass.
+    Takes the /triage filters; pages of up to FORECAST_MAX_PATIENTS come in
+    triage order with next_cursor. Each forecast has one value per
+    horizon_minutes entry and projects the patient's forecast filter state
+    to now; current_value is their latest reading. Patients whose latest
+    reading is RESET_GAP_MINUTES old or more get no forecast, and patients
+    without readings start flat from their profile average (both null when
+    that is unknown too).
+    """
+    limit = max(1, min(limit, settings.FORECAST_MAX_PATIENTS))
+    stale_before = datetime.utcnow() - timedelta(minutes=stale_minutes) if stale_minutes else None
+    # Each patient's stored filter state rides along with the triage page
+    query = triage_query(risk_level, trend, stale_before).add_columns(
+        GlucoseForecastState.level, GlucoseForecastState.trend.label("rate"),
+        GlucoseForecastState.last_time.label("state_time"), GlucoseForecastState.last_value
+    ).outerjoin(GlucoseForecastState, GlucoseForecastState.user_id == PatientRiskProfile.user_id)
+    items, next_cursor = await _triage_page(db, query, cursor, limit)
+    
+    # Patients without readings start flat from their profile average
+    now = datetime.utcnow()
+    elapsed = np.array([
+        max((now - item["state_time"]).total_seconds() / 60, 0.0) if item["state_time"] else np.nan
+        for item in items
+    ])
+    has_state = ~np.isnan(elapsed)
+    profile_avg = np.array([item["avg_glucose"] for item in items], dtype=float)
+    level = np.where(has_state, np.array([item["level"] for item in items], dtype=float), profile_avg)
+    rate = np.where(has_state, np.array([item["rate"] for item in items], dtype=float), 0.0)
+    current = np.round(np.where(has_state, np.array([item["last_value"] for item in items], dtype=float), level), 1)
+    
+    forecasts = glucose_predictor.predict_batch(level, rate, np.nan_to_num(elapsed), hours=hours)
+    
+    known = ~np.isnan(current)
+    # A stale state is not projected across the gap
+    projected = known & ~(elapsed >= RESET_GAP_MINUTES)
+    results = [
+        {
+            "user_id": item["user_id"],
+            "name": item["name"],
+            "risk_level": item["risk_level"],
+            "current_value": value if ok else None,
+            "reading_age_minutes": int(age) if with_state else None,
+            "forecast": forecast if fresh else None,
+        }
+        for item, ok, with_state, fresh, value, age, forecast in zip(
+            items, known.tolist(), has_state.tolist(), projected.tolist(),
+            current.tolist(), elapsed.tolist(), forecasts.tolist()
+        )
+    ]
+    
+    return ORJSONResponse({
+        "horizon_minutes": glucose_predictor.horizons(hours).tolist(),
+        "items": results,
+        "next_cursor": next_cursor,
+    })
+
+
+def _key_insights(avg_glucose: float, time_in_range: float, hypo_events: int, trend: str) -> List[str]:
+    """Generate the key insights of an executive summary."""
     insights = []
     
     if avg_glucose > 140:
@@ -114,12 +296,4 @@ async def get_executive_summary(
     if not insights:
         insights.append("Glucose patterns stable and within targets")
     
-    return ExecutiveSummaryResponse(
-        patient_name=profile.name,
-        avg_glucose=round(avg_glucose, 1),
-        time_in_range=round(time_in_range, 1),
-        hypo_events=hypo_events,
-        hyper_events=hyper_events,
-        trend=trend,
-        key_insights=insights
-    )
+    return insights
@@ -0,0 +1,130 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from datetime import datetime
+import csv
+import heapq
+import io
+import json
+
+from database import ReadSessionLocal
+from models import GlucoseReading, MealLog, VoiceLog
+from services.glucose_archive import glucose_archive
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+EXPORT_COLUMNS = {
+    "glucose": ["id", "user_id", "timestamp", "value", "source", "notes"],
+    "meals": ["id", "user_id", "created_at", "carbs_estimate", "meal_type", "confidence", "notes", "image_path"],
+    "voice": ["id", "user_id", "created_at", "intent", "transcript", "extracted_data"],
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Rows fetched per round-trip from the server-side cursor
+FETCH_SIZE = 1000
+
+
+def _iter_rows(kind: str, user_id: int):
+    """Yield a patient's rows as tuples, oldest first, with constant memory."""
+    columns = EXPORT_COLUMNS[kind]
+
+    if kind == "glucose":
+        rows = _iter_table(GlucoseReading, GlucoseReading.timestamp, columns, user_id)
+        archived = (tuple(getattr(r, c) for c in columns) for r in glucose_archive.iter_range(user_id))
+        # Late backfills can leave hot rows older than archived ones, so the
+        # two (timestamp, id)-ordered streams are merged rather than chained
+        ts, row_id = columns.index("timestamp"), columns.index("id")
+        return heapq.merge(archived, rows, key=lambda row: (row[ts], row[row_id]))
+    if kind == "meals":
+        return _iter_table(MealLog, MealLog.created_at, columns, user_id)
+    return _iter_table(VoiceLog, VoiceLog.created_at, columns, user_id)
+
+
+def _iter_table(model, order, columns, user_id: int):
+    """Yield a patient's rows of one table, ordered by (order, id)."""
+    # The response outlives the request's dependencies, so the stream
+    # owns its session (a replica when one is configured)
+    db = ReadSessionLocal()
+    try:
+        result = db.execute(
+            select(*[getattr(model, c) for c in columns])
+            .where(model.user_id == user_id)
+            .order_by(order, model.id)
+            .execution_options(stream_results=True, yield_per=FETCH_SIZE)
+        )
+        for row in result:
+            yield tuple(row)
+    finally:
+        db.close()
+
+
+def _format_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _stream_csv(kind: str, user_id: int):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS[kind])
+
+    for i, row in enumerate(_iter_rows(kind, user_id), 1):
+        writer.writerow([_format_value(v) for v in row])
+        if i % FETCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def _stream_ndjson(kind: str, user_id: int):
+    columns = EXPORT_COLUMNS[kind]
+    chunk = []
+
+    for row in _iter_rows(kind, user_id):
+        record = {c: _format_value(v) for c, v in zip(columns, row)}
+        if kind == "voice" and record["extracted_data"]:
+            record["extracted_data"] = json.loads(record["extracted_data"])
+        chunk.append(json.dumps(record))
+        if len(chunk) >= FETCH_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+@router.get("/{kind}")
+async def export_patient_data(
+    kind: str,
+    format: str = "csv",
+    user_id: int = 1
+):
+    """
+    Stream a patient's full glucose, meal or voice log history.
+    Rows are read through a server-side cursor and written out as CSV or
+    NDJSON as they arrive, so memory stays flat for any history length.
+    """
+    if kind not in EXPORT_COLUMNS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown export. Available: {', '.join(EXPORT_COLUMNS)}"
+        )
+    if format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format. Allowed: {', '.join(MEDIA_TYPES)}"
+        )
+
+    stream = _stream_csv(kind, user_id) if format == "csv" else _stream_ndjson(kind, user_id)
+    filename = f"dia-pilot-{kind}-{user_id}.{format}"
+
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
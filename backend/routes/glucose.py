@@ -1,63 +1,387 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from typing import List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import json
+import os
 import random
+import uuid
 
-from database import get_db
-from models import GlucoseReading
+from config import settings
+from database import get_db, get_read_db
+from models import GlucoseReading, ImportJob
 from schemas import (
     GlucoseReadingCreate,
     GlucoseReadingResponse,
+    GlucoseReadingPage,
+    GlucoseBatchRowStatus,
+    GlucoseBatchResponse,
+    ImportJobResponse,
+    GlucoseSeriesPoint,
+    GlucoseSeriesResponse,
+    AGPResponse,
     GlucoseStatsResponse,
     GlucosePrediction,
     CrashGuardResponse
 )
 from services.glucose_predictor import glucose_predictor
+from services.glucose_ingest import glucose_ingestor
+from services.glucose_stats import glucose_stats
+from queries import readings_query, newest_reading, reading_count
+from pagination import keyset_page, page_size, encode_cursor, decode_cursor
+from etags import make_etag, not_modified
+from services.glucose_archive import glucose_archive
+from services.cgm_importer import cgm_importer
+from services.glucose_analytics import glucose_analytics
+from services.live_updates import live_updates
+from services.idempotency import idempotency_store
+from services.response_cache import response_cache
 
 router = APIRouter(prefix="/api/glucose", tags=["glucose"])
 
+# Comment line sent on idle streams so proxies keep the connection open
+SSE_KEEPALIVE_SECONDS = 15
+
+
+async def _idempotent_replay(request: Request, key: Optional[str], db: AsyncSession) -> Optional[Response]:
+    """Return the stored response if this Idempotency-Key was already served."""
+    if not key:
+        return None
+    stored = await db.run_sync(
+        idempotency_store.lookup, key, request.url.path, idempotency_store.fingerprint(await request.body())
+    )
+    if stored is None:
+        return None
+    return _replayed(*stored)
+
+
+def _replayed(status_code: int, body: str) -> Response:
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+async def _remember_response(request: Request, key: Optional[str], db: AsyncSession, response):
+    """
+    Store the response under its Idempotency-Key. Returns it, or the stored
+    one if a concurrent retry with the same key finished first.
+    """
+    if not key:
+        return response
+    body = response.model_dump_json()
+    status_code, stored_body = await db.run_sync(
+        idempotency_store.save, key, request.url.path, idempotency_store.fingerprint(await request.body()),
+        200, body
+    )
+    if stored_body != body:
+        return _replayed(status_code, stored_body)
+    return response
+
 
 @router.post("/reading", response_model=GlucoseReadingResponse)
 async def add_glucose_reading(
     reading: GlucoseReadingCreate,
-    db: Session = Depends(get_db)
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Add a new glucose reading.
+    Re-sending a reading with the same user_id, timestamp and source
+    returns the stored row instead of inserting it again.
+    """
+    replay = await _idempotent_replay(request, idempotency_key, db)
+    if replay is not None:
+        return replay
+
+    # Archive lookups are file IO, kept off the event loop
+    prepared = await asyncio.to_thread(glucose_ingestor.prepare, [reading])
+    stored = await db.run_sync(glucose_ingestor.store, prepared)
+    response = GlucoseReadingResponse(**stored[0])
+    return await _remember_response(request, idempotency_key, db, response)
+
+
+def _parse_batch_body(raw: bytes, content_type: str) -> list:
+    """Split a JSON array or NDJSON body into (payload, error) pairs."""
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = []
+        for line in raw.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append((json.loads(line), None))
+            except json.JSONDecodeError as e:
+                items.append((None, f"Malformed JSON line: {e.msg}"))
+        return items
+
+    try:
+        payload = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed JSON body: {e.msg}")
+
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of readings")
+
+    return [(item, None) for item in payload]
+
+
+@router.post("/readings/batch", response_model=GlucoseBatchResponse)
+async def add_glucose_readings_batch(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Add a new glucose reading."""
-    glucose_reading = GlucoseReading(
-        value=reading.value,
-        timestamp=reading.timestamp or datetime.utcnow(),
-        source=reading.source,
-        notes=reading.notes
+    """
+    Bulk-ingest glucose readings from a CGM bridge.
+    Accepts a JSON array or NDJSON (application/x-ndjson) body; all valid
+    rows are inserted in one transaction and a status is returned per row.
+    Readings already stored (same user_id, timestamp and source) are
+    reported as duplicates with the existing id.
+    """
+    replay = await _idempotent_replay(request, idempotency_key, db)
+    if replay is not None:
+        return replay
+
+    raw = await request.body()
+    items = _parse_batch_body(raw, request.headers.get("content-type", ""))
+
+    if len(items) > settings.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large. Max readings per batch: {settings.MAX_BATCH_SIZE}"
+        )
+
+    results: List[GlucoseBatchRowStatus] = []
+    valid: List[GlucoseReadingCreate] = []
+    valid_indexes: List[int] = []
+
+    for index, (payload, error) in enumerate(items):
+        if error is None:
+            try:
+                valid.append(GlucoseReadingCreate.model_validate(payload))
+                valid_indexes.append(index)
+                results.append(GlucoseBatchRowStatus(index=index, status="created"))
+                continue
+            except ValidationError as e:
+                error = "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}"
+                    for err in e.errors()
+                )
+        results.append(GlucoseBatchRowStatus(index=index, status="invalid", error=error))
+
+    prepared = await asyncio.to_thread(glucose_ingestor.prepare, valid)
+    stored = await db.run_sync(glucose_ingestor.store, prepared)
+    duplicates = 0
+    for index, row in zip(valid_indexes, stored):
+        results[index].id = row["id"]
+        if row["duplicate"]:
+            results[index].status = "duplicate"
+            duplicates += 1
+
+    response = GlucoseBatchResponse(
+        received=len(items),
+        created=len(stored) - duplicates,
+        duplicates=duplicates,
+        rejected=len(items) - len(stored),
+        results=results
+    )
+    return await _remember_response(request, idempotency_key, db, response)
+
+
+def _import_job_response(job: ImportJob) -> ImportJobResponse:
+    progress = 100.0 if job.status == "completed" else (
+        job.bytes_processed / job.bytes_total * 100 if job.bytes_total else 0.0
+    )
+    return ImportJobResponse(
+        id=job.id,
+        user_id=job.user_id,
+        filename=job.filename,
+        status=job.status,
+        progress=round(progress, 1),
+        rows_imported=job.rows_imported,
+        rows_rejected=job.rows_rejected,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at
     )
-    db.add(glucose_reading)
-    db.commit()
-    db.refresh(glucose_reading)
-    return glucose_reading
 
 
-@router.get("/readings", response_model=List[GlucoseReadingResponse])
+@router.post("/import", response_model=ImportJobResponse, status_code=202)
+async def import_cgm_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Upload a CGM vendor CSV export (Dexcom, Libre, CareLink, ...).
+    The file is spooled to disk and imported by a background worker;
+    poll the returned job for progress.
+    """
+    file_ext = os.path.splitext(file.filename or "")[1].lower()
+    if file_ext not in (".csv", ".txt"):
+        raise HTTPException(status_code=400, detail="Invalid file type. Allowed: .csv, .txt")
+
+    # Spool to disk in chunks so the upload never sits in memory
+    file_path = os.path.join(settings.IMPORT_DIR, f"{uuid.uuid4()}{file_ext}")
+    size = 0
+    with open(file_path, "wb") as f:
+        while chunk := await file.read(1024 * 1024):
+            size += len(chunk)
+            f.write(chunk)
+
+    job = ImportJob(
+        user_id=user_id,
+        filename=file.filename,
+        file_path=file_path,
+        bytes_total=size,
+        created_at=datetime.utcnow()
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+
+    # Sync background tasks run in the threadpool, off the event loop
+    background_tasks.add_task(cgm_importer.run, job.id)
+
+    return _import_job_response(job)
+
+
+@router.get("/import/{job_id}", response_model=ImportJobResponse)
+async def get_import_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the status and progress of a CGM file import."""
+    job = await db.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return _import_job_response(job)
+
+
+@router.get("/readings", response_model=GlucoseReadingPage)
 async def get_glucose_readings(
+    request: Request,
+    response: Response,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get recent glucose readings."""
-    readings = db.query(GlucoseReading).order_by(
-        GlucoseReading.timestamp.desc()
-    ).limit(limit).all()
-    return readings
+    """
+    Get glucose readings, newest first.
+    Pass the returned next_cursor to fetch the following (older) page.
+    Supports If-None-Match; unchanged pages return 304.
+    """
+    limit = page_size(limit)
+    newest = (await db.execute(newest_reading(user_id))).first()
+    count = await db.scalar(reading_count(user_id))
+    etag = make_etag("glucose", user_id, limit, cursor, count, *(newest or ()))
+    unchanged = not_modified(request, response, etag)
+    if unchanged:
+        return unchanged
+
+    readings, next_cursor = await keyset_page(
+        db,
+        readings_query(user_id),
+        GlucoseReading.timestamp,
+        GlucoseReading.id,
+        cursor,
+        limit
+    )
+
+    # Older pages continue transparently into the cold archive
+    newest_archived = await asyncio.to_thread(glucose_archive.newest_day, user_id)
+    if newest_archived and (
+        next_cursor is None or readings[-1].timestamp.date() <= newest_archived
+    ):
+        before = decode_cursor(cursor) if cursor else None
+        archived = await asyncio.to_thread(glucose_archive.page_desc, user_id, before, limit + 1)
+        merged = sorted(
+            list(readings) + archived,
+            key=lambda r: (r.timestamp, r.id),
+            reverse=True
+        )
+        has_more = next_cursor is not None or len(merged) > limit
+        readings = merged[:limit]
+        next_cursor = encode_cursor(readings[-1].timestamp, readings[-1].id) if has_more else None
+
+    return GlucoseReadingPage(items=readings, next_cursor=next_cursor)
+
+
+@router.get("/range", response_model=GlucoseSeriesResponse)
+async def get_glucose_range(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    max_points: int = Query(300, ge=3, le=5000),
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get a chart-ready glucose series for a time range.
+    Ranges with more than max_points readings are downsampled with
+    Largest-Triangle-Three-Buckets, so the payload stays flat as the
+    range grows.
+    """
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    archived = await asyncio.to_thread(glucose_analytics.load_archived, user_id, start, end)
+    timestamps, values = await db.run_sync(glucose_analytics.load_series, user_id, start, end, archived)
+    keep = glucose_analytics.lttb(timestamps.astype("int64"), values, max_points)
+
+    points = [
+        GlucoseSeriesPoint(timestamp=ts, value=round(float(v), 1))
+        for ts, v in zip(timestamps[keep].tolist(), values[keep])
+    ]
+    return GlucoseSeriesResponse(
+        points=points,
+        total_points=len(values),
+        downsampled=len(keep) < len(values)
+    )
+
+
+@router.get("/agp", response_model=AGPResponse)
+async def get_ambulatory_glucose_profile(
+    days: int = Query(14, ge=1, le=90),
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the Ambulatory Glucose Profile: 5th/25th/50th/75th/95th percentile
+    bands by time of day, plus GMI, CV and time in/below/above range.
+    """
+    hit, agp = glucose_analytics.cached_agp(user_id, days)
+    if not hit:
+        end = datetime.utcnow()
+        archived = await asyncio.to_thread(
+            glucose_analytics.load_archived, user_id, end - timedelta(days=days), end
+        )
+        agp = await db.run_sync(glucose_analytics.agp, user_id, days=days, end=end, archived=archived)
+    if agp is None:
+        raise HTTPException(status_code=404, detail="No glucose readings in this window")
+    return AGPResponse(days=days, **agp)
 
 
 @router.get("/stats", response_model=GlucoseStatsResponse)
-async def get_glucose_stats(db: Session = Depends(get_db)):
+@response_cache.cached("glucose:stats")
+async def get_glucose_stats(
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
+):
     """Get glucose statistics."""
-    # Get readings from last 24 hours
-    since = datetime.utcnow() - timedelta(days=1)
-    readings = db.query(GlucoseReading).filter(
-        GlucoseReading.timestamp >= since
-    ).all()
-    
-    if not readings:
+    # Served from the in-memory 24-hour window, checked against the rollups
+    stats = await db.run_sync(glucose_stats.snapshot, user_id)
+
+    if not stats:
         # Return mock data if no readings
         return GlucoseStatsResponse(
             avg_glucose=105.0,
@@ -65,93 +389,85 @@ async def get_glucose_stats(db: Session = Depends(get_db)):
             variability="Low",
             current_value=98.0
         )
-    
-    values = [r.value for r in readings]
-    avg = sum(values) / len(values)
-    
-    # Time in range (70-180 mg/dL)
-    in_range = [v for v in values if 70 <= v <= 180]
-    time_in_range = (len(in_range) / len(values)) * 100
-    
-    # Variability
-    if len(values) > 1:
-        std_dev = (sum((x - avg) ** 2 for x in values) / len(values)) ** 0.5
-        variability = "Low" if std_dev < 20 else ("Medium" if std_dev < 40 else "High")
-    else:
-        variability = "Low"
-    
+
+    std_dev = stats["std_dev"]
+    variability = "Low" if std_dev < 20 else ("Medium" if std_dev < 40 else "High")
+
     return GlucoseStatsResponse(
-        avg_glucose=round(avg, 1),
-        time_in_range=round(time_in_range, 1),
+        avg_glucose=round(stats["mean"], 1),
+        time_in_range=round(stats["time_in_range"], 1),
         variability=variability,
-        current_value=values[0] if values else 98.0
+        current_value=stats["current_value"]
     )
 
 
 @router.get("/predictions", response_model=List[GlucosePrediction])
-async def get_glucose_predictions(db: Session = Depends(get_db)):
+@response_cache.cached("glucose:predictions")
+async def get_glucose_predictions(
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
+):
     """Get predicted glucose values for next 3 hours."""
-    # Get most recent reading
-    latest = db.query(GlucoseReading).order_by(
-        GlucoseReading.timestamp.desc()
-    ).first()
-    
-    current_value = latest.value if latest else 98.0
-    
-    # Generate predictions
-    predictions = glucose_predictor.predict_next_hours(current_value, hours=3)
+    # Forecast from the patient's stored filter state
+    predictions = await db.run_sync(glucose_predictor.predict_for_user, user_id, 3)
     
     return [GlucosePrediction(**p) for p in predictions]
 
 
 @router.get("/crash-guard", response_model=CrashGuardResponse)
-async def get_crash_guard_alert(db: Session = Depends(get_db)):
+@response_cache.cached("glucose:crash-guard")
+async def get_crash_guard_alert(
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
+):
     """Get hypoglycemia risk assessment."""
-    # Get recent readings
-    readings = db.query(GlucoseReading).order_by(
-        GlucoseReading.timestamp.desc()
-    ).limit(5).all()
+    # Assess from the patient's stored filter state
+    assessment = await db.run_sync(glucose_predictor.crash_guard, user_id)
     
-    if not readings:
+    if assessment is None:
         # Mock data if no readings
-        current = 98.0
-        predicted = 95.0
-        risk = "low"
-        time_est = None
-        recommendations = ["Keep monitoring glucose levels"]
-    else:
-        values = [r.value for r in readings]
-        current = values[0]
-        
-        # Check hypoglycemia risk
-        risk, time_est, predicted = glucose_predictor.check_hypo_risk(
-            current, values
+        return CrashGuardResponse(
+            risk_level="low",
+            estimated_time=None,
+            current_glucose=98.0,
+            predicted_glucose=95.0,
+            recommendations=["Keep monitoring glucose levels"]
         )
-        
-        # Generate recommendations
-        recommendations = []
-        if risk == "high":
-            recommendations = [
-                "Consume 15g fast-acting carbs immediately",
-                "Recheck glucose in 15 minutes",
-                "Alert emergency contact if < 54 mg/dL"
-            ]
-        elif risk == "medium":
-            recommendations = [
-                "Consider having a small snack",
-                "Monitor closely for next 30 minutes",
-                "Keep fast-acting carbs nearby"
-            ]
-        else:
-            recommendations = [
-                "Glucose levels stable",
-                "Continue normal monitoring"
-            ]
     
-    return CrashGuardResponse(
-        risk_level=risk,
-        estimated_time=time_est,
-        current_glucose=current,
-        predicted_glucose=predicted,
-        recommendations=recommendations
+    return CrashGuardResponse(**assessment)
+
+
+@router.get("/stream")
+async def stream_glucose_events(
+    request: Request,
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Server-sent events for one patient.
+    Emits a `reading` event for every stored reading and a `crash-guard`
+    event with a fresh assessment after each ingest, replacing polling of
+    /stats, /predictions and /crash-guard.
+    """
+    assessment = await db.run_sync(glucose_predictor.crash_guard, user_id)
+    queue = live_updates.subscribe(user_id)
+
+    async def events():
+        try:
+            if assessment is not None:
+                yield f"event: crash-guard\ndata: {CrashGuardResponse(**assessment).model_dump_json()}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {data}\n\n"
+        finally:
+            live_updates.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import json
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from typing import Optional
 
 from database import get_db
 from models import HealthProfile, DiagnosisRecord
-from schemas import HealthProfileCreate, HealthProfileResponse, DiagnosisResponse
+from schemas import HealthProfileCreate, HealthProfileResponse, DiagnosisResponse, DiagnosisPage
+from etags import make_etag, not_modified
+from pagination import keyset_page, page_size
 from services.health_analyzer import health_analyzer
+from services.write_behind import write_behind
 
 router = APIRouter(prefix="/api/health", tags=["health"])
 
@@ -14,23 +19,22 @@ router = APIRouter(prefix="/api/health", tags=["health"])
 @router.post("/profile", response_model=HealthProfileResponse)
 async def create_or_update_health_profile(
     profile_data: HealthProfileCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create or update user's health profile with comprehensive metrics.
     """
     # Check if profile exists
-    existing_profile = db.query(HealthProfile).filter(
-        HealthProfile.user_id == 1  # Default user
-    ).first()
+    existing_profile = await db.scalar(
+        select(HealthProfile).where(HealthProfile.user_id == 1)  # Default user
+    )
     
     if existing_profile:
         # Update existing profile
         for field, value in profile_data.dict(exclude_unset=True).items():
             setattr(existing_profile, field, value)
         existing_profile.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(existing_profile)
+        await db.commit()
         return existing_profile
     else:
         # Create new profile
@@ -40,36 +44,45 @@ async def create_or_update_health_profile(
             updated_at=datetime.utcnow()
         )
         db.add(new_profile)
-        db.commit()
-        db.refresh(new_profile)
+        await db.commit()
+        await db.refresh(new_profile)
         return new_profile
 
 
 @router.get("/profile", response_model=HealthProfileResponse)
-async def get_health_profile(db: Session = Depends(get_db)):
+async def get_health_profile(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
     """
     Get user's current health profile.
+    Supports If-None-Match; an unchanged profile returns 304.
     """
-    profile = db.query(HealthProfile).filter(
-        HealthProfile.user_id == 1
-    ).first()
+    profile = await db.scalar(
+        select(HealthProfile).where(HealthProfile.user_id == 1)
+    )
     
     if not profile:
         raise HTTPException(status_code=404, detail="Health profile not found. Please create one first.")
     
+    unchanged = not_modified(request, response, make_etag("profile", profile.id, profile.updated_at))
+    if unchanged:
+        return unchanged
+    
     return profile
 
 
 @router.post("/diagnose", response_model=DiagnosisResponse)
-async def get_ai_diagnosis(db: Session = Depends(get_db)):
+async def get_ai_diagnosis(db: AsyncSession = Depends(get_db)):
     """
     Get AI-powered health diagnosis based on current health profile.
     Analyzes vitals, lab values, lifestyle, and generates personalized recommendations.
     """
     # Get health profile
-    profile = db.query(HealthProfile).filter(
-        HealthProfile.user_id == 1
-    ).first()
+    profile = await db.scalar(
+        select(HealthProfile).where(HealthProfile.user_id == 1)
+    )
     
     if not profile:
         raise HTTPException(
@@ -101,60 +114,85 @@ async def get_ai_diagnosis(db: Session = Depends(get_db)):
     # Run AI analysis
     analysis = health_analyzer.analyze_health_profile(profile_dict)
     
-    # Save diagnosis record
-    diagnosis = DiagnosisRecord(
-        user_id=1,
-        overall_health_score=analysis["overall_health_score"],
-        risk_level=analysis["risk_level"],
-        key_concerns=json.dumps(analysis["key_concerns"]),
-        positive_factors=json.dumps(analysis["positive_factors"]),
-        predicted_complications=json.dumps(analysis["predicted_complications"]),
-        recommendations=json.dumps(analysis["recommendations"]),
-        action_items=json.dumps(analysis["action_items"]),
-        created_at=datetime.utcnow()
-    )
-    
-    db.add(diagnosis)
-    db.commit()
-    db.refresh(diagnosis)
+    # Save diagnosis record (batched; always waits since the response needs the id)
+    created_at = datetime.utcnow()
+    diagnosis_id = await write_behind.submit(DiagnosisRecord, {
+        "user_id": 1,
+        "overall_health_score": analysis["overall_health_score"],
+        "risk_level": analysis["risk_level"],
+        "key_concerns": analysis["key_concerns"],
+        "positive_factors": analysis["positive_factors"],
+        "predicted_complications": analysis["predicted_complications"],
+        "recommendations": analysis["recommendations"],
+        "action_items": analysis["action_items"],
+        "created_at": created_at
+    }, wait=True)
     
     # Format response
     return DiagnosisResponse(
-        id=diagnosis.id,
-        overall_health_score=diagnosis.overall_health_score,
-        risk_level=diagnosis.risk_level,
-        key_concerns=json.loads(diagnosis.key_concerns),
-        positive_factors=json.loads(diagnosis.positive_factors),
-        predicted_complications=json.loads(diagnosis.predicted_complications),
-        recommendations=json.loads(diagnosis.recommendations),
-        action_items=json.loads(diagnosis.action_items),
-        created_at=diagnosis.created_at
+        id=diagnosis_id,
+        overall_health_score=analysis["overall_health_score"],
+        risk_level=analysis["risk_level"],
+        key_concerns=analysis["key_concerns"],
+        positive_factors=analysis["positive_factors"],
+        predicted_complications=analysis["predicted_complications"],
+        recommendations=analysis["recommendations"],
+        action_items=analysis["action_items"],
+        created_at=created_at
     )
 
 
-@router.get("/diagnoses", response_model=list[DiagnosisResponse])
+# Columns of a DiagnosisResponse, in response order
+DIAGNOSIS_COLUMNS = [
+    DiagnosisRecord.id,
+    DiagnosisRecord.overall_health_score,
+    DiagnosisRecord.risk_level,
+    DiagnosisRecord.key_concerns,
+    DiagnosisRecord.positive_factors,
+    DiagnosisRecord.predicted_complications,
+    DiagnosisRecord.recommendations,
+    DiagnosisRecord.action_items,
+    DiagnosisRecord.created_at,
+]
+
+
+@router.get("/diagnoses", response_model=DiagnosisPage)
 async def get_diagnosis_history(
+    request: Request,
+    response: Response,
     limit: int = 5,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get history of AI diagnoses.
+    Get history of AI diagnoses, newest first.
+    Pass the returned next_cursor to fetch the following (older) page.
+    Supports If-None-Match; unchanged pages return 304.
     """
-    diagnoses = db.query(DiagnosisRecord).filter(
-        DiagnosisRecord.user_id == 1
-    ).order_by(DiagnosisRecord.created_at.desc()).limit(limit).all()
+    # Diagnoses are append-only, so the newest row versions every page
+    newest = (await db.execute(
+        select(DiagnosisRecord.created_at, DiagnosisRecord.id)
+        .where(DiagnosisRecord.user_id == 1)
+        .order_by(DiagnosisRecord.created_at.desc(), DiagnosisRecord.id.desc())
+        .limit(1)
+    )).first()
+    etag = make_etag("diagnoses", page_size(limit), cursor, *(newest or ()))
+    unchanged = not_modified(request, response, etag)
+    if unchanged:
+        return unchanged
     
-    return [
-        DiagnosisResponse(
-            id=d.id,
-            overall_health_score=d.overall_health_score,
-            risk_level=d.risk_level,
-            key_concerns=json.loads(d.key_concerns),
-            positive_factors=json.loads(d.positive_factors),
-            predicted_complications=json.loads(d.predicted_complications),
-            recommendations=json.loads(d.recommendations),
-            action_items=json.loads(d.action_items),
-            created_at=d.created_at
-        )
-        for d in diagnoses
-    ]
+    rows, next_cursor = await keyset_page(
+        db,
+        select(*DIAGNOSIS_COLUMNS).where(DiagnosisRecord.user_id == 1),
+        DiagnosisRecord.created_at,
+        DiagnosisRecord.id,
+        cursor,
+        limit
+    )
+    
+    # Rows come straight from our own JSON columns, so they are serialized
+    # as-is instead of being validated through DiagnosisResponse again
+    return ORJSONResponse({
+        "items": [row._asdict() for row in rows],
+        "next_cursor": next_cursor
+    }, headers=dict(response.headers))
@@ -1,23 +1,26 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import uuid
 from datetime import datetime
-from typing import List
+from typing import Optional
 
 from database import get_db
 from models import MealLog
-from schemas import MealLogResponse, MealAnalysisResponse
+from schemas import MealLogResponse, MealLogPage, MealAnalysisResponse
 from services.meal_analyzer import meal_analyzer
 from config import settings
+from etags import make_etag, not_modified
+from pagination import keyset_page, page_size
+from services.write_behind import write_behind
 
 router = APIRouter(prefix="/api/meals", tags=["meals"])
 
 
 @router.post("/snap", response_model=MealAnalysisResponse)
 async def upload_meal_photo(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
     """
     Upload a meal photo and get carbohydrate estimate.
@@ -56,17 +59,14 @@ async def upload_meal_photo(
         # Analyze image
         carbs_estimate, meal_type, confidence = meal_analyzer.analyze_image(file_path)
         
-        # Save to database
-        meal_log = MealLog(
-            image_path=file_path,
-            carbs_estimate=carbs_estimate,
-            meal_type=meal_type,
-            confidence=confidence,
-            created_at=datetime.utcnow()
-        )
-        db.add(meal_log)
-        db.commit()
-        db.refresh(meal_log)
+        # Save to database (batched with other log writes)
+        await write_behind.submit(MealLog, {
+            "image_path": file_path,
+            "carbs_estimate": carbs_estimate,
+            "meal_type": meal_type,
+            "confidence": confidence,
+            "created_at": datetime.utcnow()
+        })
         
         return MealAnalysisResponse(
             carbs_estimate=carbs_estimate,
@@ -84,27 +84,52 @@ async def upload_meal_photo(
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
-@router.get("/history", response_model=List[MealLogResponse])
+@router.get("/history", response_model=MealLogPage)
 async def get_meal_history(
+    request: Request,
+    response: Response,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get recent meal logs.
+    Get meal logs, newest first.
+    Pass the returned next_cursor to fetch the following (older) page.
+    Supports If-None-Match; unchanged pages return 304.
     """
-    meals = db.query(MealLog).order_by(MealLog.created_at.desc()).limit(limit).all()
-    return meals
+    # Meal logs are append-only, so the newest row versions every page
+    newest = (await db.execute(
+        select(MealLog.created_at, MealLog.id)
+        .where(MealLog.user_id == user_id)
+        .order_by(MealLog.created_at.desc(), MealLog.id.desc())
+        .limit(1)
+    )).first()
+    etag = make_etag("meals", user_id, page_size(limit), cursor, *(newest or ()))
+    unchanged = not_modified(request, response, etag)
+    if unchanged:
+        return unchanged
+    
+    meals, next_cursor = await keyset_page(
+        db,
+        select(MealLog).where(MealLog.user_id == user_id),
+        MealLog.created_at,
+        MealLog.id,
+        cursor,
+        limit
+    )
+    return MealLogPage(items=meals, next_cursor=next_cursor)
 
 
 @router.get("/{meal_id}", response_model=MealLogResponse)
 async def get_meal(
     meal_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get specific meal details.
     """
-    meal = db.query(MealLog).filter(MealLog.id == meal_id).first()
+    meal = await db.get(MealLog, meal_id)
     if not meal:
         raise HTTPException(status_code=404, detail="Meal not found")
     return meal
@@ -1,12 +1,10 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from database import get_db
 from schemas import SimulationRequest, SimulationDataPoint
 from services.glucose_predictor import glucose_predictor
-from models import GlucoseReading
-from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/api/predictions", tags=["predictions"])
 
@@ -14,17 +12,16 @@ router = APIRouter(prefix="/api/predictions", tags=["predictions"])
 @router.post("/simulate", response_model=List[SimulationDataPoint])
 async def simulate_glucose(
     request: SimulationRequest,
-    db: Session = Depends(get_db)
+    user_id: int = 1,
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Simulate glucose response to different scenarios.
     """
-    # Get current glucose value
-    latest = db.query(GlucoseReading).order_by(
-        GlucoseReading.timestamp.desc()
-    ).first()
+    # Current glucose is the latest reading kept in the forecast state
+    loaded = await db.run_sync(glucose_predictor.load_state, user_id)
     
-    current_value = latest.value if latest else 98.0
+    current_value = loaded[0].last_value if loaded else 98.0
     
     # Run simulation
     results = glucose_predictor.simulate_scenario(
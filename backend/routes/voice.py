@@ -1,21 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException
 import json
 from datetime import datetime
 
-from database import get_db
 from models import VoiceLog
 from schemas import VoiceCommandRequest, VoiceCommandResponse
 from services.voice_processor import voice_processor
+from services.write_behind import write_behind
 
 router = APIRouter(prefix="/api/voice", tags=["voice"])
 
 
 @router.post("/command", response_model=VoiceCommandResponse)
-async def process_voice_command(
-    request: VoiceCommandRequest,
-    db: Session = Depends(get_db)
-):
+async def process_voice_command(request: VoiceCommandRequest):
     """
     Process voice command and extract structured data.
     """
@@ -25,15 +21,13 @@ async def process_voice_command(
             request.transcript
         )
         
-        # Save to database
-        voice_log = VoiceLog(
-            transcript=request.transcript,
-            intent=intent,
-            extracted_data=json.dumps(extracted_data) if extracted_data else None,
-            created_at=datetime.utcnow()
-        )
-        db.add(voice_log)
-        db.commit()
+        # Save to database (batched with other log writes)
+        await write_behind.submit(VoiceLog, {
+            "transcript": request.transcript,
+            "intent": intent,
+            "extracted_data": json.dumps(extracted_data) if extracted_data else None,
+            "created_at": datetime.utcnow()
+        })
         
         return VoiceCommandResponse(
             intent=intent,
@@ -18,6 +18,11 @@ class MealLogResponse(BaseModel):
         from_attributes = True
 
 
+class MealLogPage(BaseModel):
+    items: List[MealLogResponse]
+    next_cursor: Optional[str] = None
+
+
 class MealAnalysisResponse(BaseModel):
     carbs_estimate: float
     meal_type: Optional[str] = None
@@ -27,6 +32,7 @@ class MealAnalysisResponse(BaseModel):
 
 # Glucose Schemas
 class GlucoseReadingCreate(BaseModel):
+    user_id: int = 1
     value: float
     timestamp: Optional[datetime] = None
     source: Optional[str] = "manual"
@@ -45,6 +51,76 @@ class GlucoseReadingResponse(BaseModel):
         from_attributes = True
 
 
+class GlucoseReadingPage(BaseModel):
+    items: List[GlucoseReadingResponse]
+    next_cursor: Optional[str] = None
+
+
+class GlucoseBatchRowStatus(BaseModel):
+    index: int
+    status: str  # created, duplicate, invalid
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class GlucoseBatchResponse(BaseModel):
+    received: int
+    created: int
+    duplicates: int
+    rejected: int
+    results: List[GlucoseBatchRowStatus]
+
+
+class ImportJobResponse(BaseModel):
+    id: int
+    user_id: int
+    filename: str
+    status: str
+    progress: float  # percent of the file parsed
+    rows_imported: int
+    rows_rejected: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class GlucoseSeriesPoint(BaseModel):
+    timestamp: datetime
+    value: float
+
+
+class GlucoseSeriesResponse(BaseModel):
+    points: List[GlucoseSeriesPoint]
+    total_points: int  # readings in the range before downsampling
+    downsampled: bool
+
+
+class AGPBand(BaseModel):
+    minute: int  # start of the bin, minutes after midnight
+    time: str
+    count: int
+    p5: Optional[float] = None
+    p25: Optional[float] = None
+    p50: Optional[float] = None
+    p75: Optional[float] = None
+    p95: Optional[float] = None
+
+
+class AGPResponse(BaseModel):
+    days: int
+    readings: int
+    bin_minutes: int
+    bands: List[AGPBand]
+    mean_glucose: float
+    gmi: float  # glucose management indicator, %
+    cv: float  # coefficient of variation, %
+    time_in_range: float  # 70-180 mg/dL, %
+    time_below_range: float  # < 70 mg/dL, %
+    time_very_low: float  # < 54 mg/dL, %
+    time_above_range: float  # > 180 mg/dL, %
+    time_very_high: float  # > 250 mg/dL, %
+
+
 class GlucoseStatsResponse(BaseModel):
     avg_glucose: float
     time_in_range: float
@@ -121,6 +197,11 @@ class PatientRiskProfileResponse(BaseModel):
         from_attributes = True
 
 
+class TriagePage(BaseModel):
+    items: List[PatientRiskProfileResponse]
+    next_cursor: Optional[str] = None
+
+
 class ExecutiveSummaryResponse(BaseModel):
     patient_name: str
     avg_glucose: float
@@ -131,12 +212,38 @@ class ExecutiveSummaryResponse(BaseModel):
     key_insights: List[str]
 
 
+class PatientSummaryResponse(ExecutiveSummaryResponse):
+    patient_id: int
+    risk_level: str
+
+
+class SummaryPage(BaseModel):
+    items: List[PatientSummaryResponse]
+    next_cursor: Optional[str] = None
+
+
+class PatientForecast(BaseModel):
+    user_id: int
+    name: str
+    risk_level: str
+    current_value: Optional[float] = None
+    reading_age_minutes: Optional[int] = None
+    forecast: Optional[List[float]] = None  # one value per horizon
+
+
+class ForecastPage(BaseModel):
+    horizon_minutes: List[int]
+    items: List[PatientForecast]
+    next_cursor: Optional[str] = None
+
+
 # Crash Guard Schema
 class CrashGuardResponse(BaseModel):
-    risk_level: str  # low, medium, high
+    risk_level: str  # low, medium, high, or unknown without a reading in the last hour
     estimated_time: Optional[str] = None
-    current_glucose: float
-    predicted_glucose: float
+    current_glucose: float  # latest reading
+    predicted_glucose: Optional[float] = None
+    reading_age_minutes: Optional[int] = None
     recommendations: List[str]
 
 
@@ -205,3 +312,8 @@ class DiagnosisResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class DiagnosisPage(BaseModel):
+    items: List[DiagnosisResponse]
+    next_cursor: Optional[str] = None
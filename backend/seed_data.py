@@ -5,7 +5,9 @@ from datetime import datetime, timedelta
 import random
 
 from database import SessionLocal, init_db
-from models import GlucoseReading, MealLog, VoiceLog, CoachingNudge, PatientRiskProfile
+from models import MealLog, VoiceLog, CoachingNudge, PatientRiskProfile
+from schemas import GlucoseReadingCreate
+from services.glucose_ingest import glucose_ingestor
 
 
 def seed_database():
@@ -19,6 +21,7 @@ def seed_database():
         # Seed glucose readings
         print("Adding glucose readings...")
         base_time = datetime.utcnow() - timedelta(hours=12)
+        readings = []
         
         for i in range(20):
             time_offset = timedelta(minutes=30 * i)
@@ -26,12 +29,14 @@ def seed_database():
             base_value = 100 + random.gauss(0, 20)
             value = max(70, min(180, base_value))
             
-            reading = GlucoseReading(
+            readings.append(GlucoseReadingCreate(
                 value=round(value, 1),
                 timestamp=base_time + time_offset,
                 source="cgm" if i % 2 == 0 else "manual"
-            )
-            db.add(reading)
+            ))
+        
+        # Goes through the ingest path so rollups stay in sync
+        glucose_ingestor.ingest(db, readings)
         
         # Seed patient risk profiles
         print("Adding patient profiles...")
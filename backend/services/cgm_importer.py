@@ -0,0 +1,165 @@
+import csv
+import os
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from config import settings
+from database import SessionLocal
+from models import ImportJob
+from schemas import GlucoseReadingCreate
+from services.glucose_ingest import glucose_ingestor
+
+MMOL_TO_MGDL = 18.0
+
+# Header names used by common CGM vendor exports (lower-cased)
+TIMESTAMP_COLUMNS = [
+    "timestamp (yyyy-mm-ddthh:mm:ss)",  # Dexcom Clarity
+    "device timestamp",  # FreeStyle Libre
+    "timestamp",
+    "date/time",
+    "datetime",
+    "time",
+]
+MGDL_COLUMNS = [
+    "glucose value (mg/dl)",  # Dexcom Clarity
+    "historic glucose mg/dl",  # FreeStyle Libre
+    "scan glucose mg/dl",
+    "sensor glucose (mg/dl)",  # Medtronic CareLink
+    "glucose",
+    "value",
+]
+MMOL_COLUMNS = [
+    "historic glucose mmol/l",
+    "scan glucose mmol/l",
+    "glucose value (mmol/l)",
+]
+TIMESTAMP_FORMATS = [
+    "%m-%d-%Y %I:%M %p",
+    "%d-%m-%Y %H:%M",
+    "%m/%d/%Y %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+]
+# Dexcom reports out-of-range sensor values as text
+OUT_OF_RANGE = {"low": 40.0, "high": 400.0}
+
+
+def _parse_timestamp(raw: str) -> datetime:
+    raw = raw.strip()
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        pass
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized timestamp: {raw!r}")
+
+
+class CGMImporter:
+    """
+    Service for importing historical CGM vendor CSV exports.
+    Parses the spooled file line by line in a worker thread and inserts
+    readings through the normal ingest path in fixed-size chunks.
+    """
+
+    def _find_columns(self, header: List[str]) -> Optional[Tuple[int, int, float]]:
+        """Locate (timestamp index, glucose index, unit factor) in a header row."""
+        names = [h.strip().lower() for h in header]
+
+        ts_index = next((names.index(c) for c in TIMESTAMP_COLUMNS if c in names), None)
+        if ts_index is None:
+            return None
+
+        for candidates, factor in ((MGDL_COLUMNS, 1.0), (MMOL_COLUMNS, MMOL_TO_MGDL)):
+            for c in candidates:
+                if c in names:
+                    return ts_index, names.index(c), factor
+        return None
+
+    def _lines(self, f, progress: list) -> Iterator[str]:
+        """Decode lines while tracking how many bytes have been read."""
+        for raw in f:
+            progress[0] += len(raw)
+            yield raw.decode("utf-8-sig", errors="replace")
+
+    def run(self, job_id: int) -> None:
+        """Process one import job to completion (runs off the event loop)."""
+        db = SessionLocal()
+        job = db.get(ImportJob, job_id)
+        if job is None:
+            db.close()
+            return
+
+        job.status = "running"
+        user_id, file_path = job.user_id, job.file_path
+        db.commit()
+
+        progress = [0]
+        try:
+            with open(file_path, "rb") as f:
+                reader = csv.reader(self._lines(f, progress))
+
+                # Vendor files may have preamble lines before the real header
+                columns = None
+                for header in reader:
+                    columns = self._find_columns(header)
+                    if columns:
+                        break
+                if columns is None:
+                    raise ValueError("No timestamp and glucose columns found in file")
+                ts_index, value_index, factor = columns
+
+                chunk: List[GlucoseReadingCreate] = []
+                for row in reader:
+                    if len(row) <= max(ts_index, value_index) or not row[value_index].strip():
+                        continue  # other event types (calibrations, insulin, ...)
+
+                    raw_value = row[value_index].strip().lower()
+                    try:
+                        value = OUT_OF_RANGE.get(raw_value) or float(raw_value) * factor
+                        chunk.append(GlucoseReadingCreate(
+                            user_id=user_id,
+                            value=round(value, 1),
+                            timestamp=_parse_timestamp(row[ts_index]),
+                            source="cgm"
+                        ))
+                    except (ValueError, ValidationError):
+                        job.rows_rejected += 1
+                        continue
+
+                    if len(chunk) >= settings.IMPORT_CHUNK_SIZE:
+                        self._flush(db, job, chunk, progress[0])
+                        chunk = []
+
+                self._flush(db, job, chunk, progress[0])
+
+            job.status = "completed"
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            db.close()
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def _flush(self, db, job: ImportJob, chunk: List[GlucoseReadingCreate],
+               bytes_processed: int) -> None:
+        """Insert one chunk and record progress."""
+        job.bytes_processed = bytes_processed
+        if chunk:
+            # Readings already stored (e.g. a re-imported file) are not counted;
+            # historical rows are not pushed to live dashboards
+            stored = glucose_ingestor.ingest(db, chunk, publish=False)
+            job.rows_imported += sum(1 for row in stored if not row["duplicate"])
+        db.commit()
+
+
+# Singleton instance
+cgm_importer = CGMImporter()
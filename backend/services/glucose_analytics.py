@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import GlucoseReading
+from services.glucose_archive import ArchivedReading, glucose_archive
+
+AGP_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class GlucoseAnalytics:
+    """
+    Vectorized analytics over a patient's glucose series.
+    Series are loaded as column arrays (hot table plus cold archive) and
+    processed with NumPy rather than per-reading Python loops. Request
+    handlers read the archive part with load_archived via asyncio.to_thread
+    and pass it in, so segment IO stays off the event loop.
+    """
+
+    def __init__(self, cache_size: int = 1024, cache_ttl: float = 300.0):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._agp_cache: "OrderedDict[Tuple[int, int, int], Tuple[int, float, dict]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        """Mark cached results for these patients as stale (new readings stored)."""
+        with self._lock:
+            for user_id in set(user_ids):
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def load_archived(self, user_id: int, start: datetime, end: datetime) -> List[ArchivedReading]:
+        """Archived readings with start <= timestamp < end, oldest first (file IO)."""
+        return list(glucose_archive.iter_range(user_id, start, end))
+
+    def load_series(self, db: Session, user_id: int, start: datetime, end: datetime,
+                    archived: Optional[List[ArchivedReading]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load readings with start <= timestamp < end, oldest first.
+
+        Args:
+            archived: The window's load_archived result, if already read
+
+        Returns:
+            Tuple of (timestamps as datetime64[ms], values as float64)
+        """
+        if archived is None:
+            archived = self.load_archived(user_id, start, end)
+        rows = db.execute(
+            select(GlucoseReading.timestamp, GlucoseReading.value).where(
+                GlucoseReading.user_id == user_id,
+                GlucoseReading.timestamp >= start,
+                GlucoseReading.timestamp < end
+            ).order_by(GlucoseReading.timestamp)
+        ).all()
+
+        timestamps = np.array(
+            [r.timestamp for r in archived] + [r.timestamp for r in rows],
+            dtype="datetime64[ms]"
+        )
+        values = np.array(
+            [r.value for r in archived] + [r.value for r in rows],
+            dtype=np.float64
+        )
+
+        if archived and rows:
+            # Late backfills can leave hot rows older than archived ones
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+
+        return timestamps, values
+
+    def lttb(self, x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+        """
+        Largest-Triangle-Three-Buckets downsampling.
+
+        Args:
+            x: Sorted x coordinates (e.g. epoch milliseconds)
+            y: Values
+            max_points: Number of points to keep (>= 3)
+
+        Returns:
+            Indices of the selected points, ascending
+        """
+        n = len(x)
+        if max_points >= n or max_points < 3:
+            return np.arange(n)
+
+        x = x.astype(np.float64)
+        # Bucket edges over the interior points; first and last are always kept
+        edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+        # Averages of every bucket in one pass, used as the third triangle vertex
+        sizes = np.diff(edges)
+        avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+        avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+        avg_x = np.append(avg_x, x[-1])
+        avg_y = np.append(avg_y, y[-1])
+
+        selected = np.empty(max_points, dtype=np.int64)
+        selected[0], selected[-1] = 0, n - 1
+        a = 0
+        for i in range(max_points - 2):
+            lo, hi = edges[i], edges[i + 1]
+            # Twice the triangle area for every candidate in the bucket at once
+            area = np.abs(
+                (x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a])
+                - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a])
+            )
+            a = lo + int(np.argmax(area))
+            selected[i + 1] = a
+
+        return selected
+
+    def cached_agp(self, user_id: int, days: int = 14, bin_minutes: int = 15) -> Tuple[bool, Optional[dict]]:
+        """
+        Look up a still-current AGP without loading anything.
+
+        Returns:
+            Tuple of (hit, agp result)
+        """
+        key = (user_id, days, bin_minutes)
+        with self._lock:
+            cached = self._agp_cache.get(key)
+            if (cached and cached[0] == self._versions.get(user_id, 0)
+                    and time.monotonic() - cached[1] < self.cache_ttl):
+                self._agp_cache.move_to_end(key)
+                return True, cached[2]
+        return False, None
+
+    def agp(self, db: Session, user_id: int, days: int = 14, bin_minutes: int = 15,
+            end: Optional[datetime] = None, archived: Optional[List[ArchivedReading]] = None) -> Optional[dict]:
+        """
+        Ambulatory Glucose Profile for the last N days (cached).
+
+        Args:
+            db: Database session
+            user_id: Patient id
+            days: Window length in days
+            bin_minutes: Width of each time-of-day bin
+            end: End of the window (default: now)
+            archived: The window's load_archived result, if already read
+
+        Returns:
+            Dict with percentile bands per time of day and summary metrics,
+            or None if there are no readings in the window
+        """
+        key = (user_id, days, bin_minutes)
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+        hit, result = self.cached_agp(user_id, days, bin_minutes)
+        if hit:
+            return result
+
+        end = end or datetime.utcnow()
+        timestamps, values = self.load_series(db, user_id, end - timedelta(days=days), end, archived)
+        result = self.compute_agp(timestamps, values, bin_minutes) if len(values) else None
+
+        with self._lock:
+            self._agp_cache[key] = (version, time.monotonic(), result)
+            self._agp_cache.move_to_end(key)
+            while len(self._agp_cache) > self.cache_size:
+                self._agp_cache.popitem(last=False)
+        return result
+
+    def compute_agp(self, timestamps: np.ndarray, values: np.ndarray, bin_minutes: int) -> dict:
+        """Percentile bands by time of day plus GMI, CV and TIR/TBR/TAR in one pass."""
+        n_bins = 1440 // bin_minutes
+        minute_of_day = (timestamps.astype("int64") // 60000) % 1440
+        bins = minute_of_day // bin_minutes
+
+        # Sort by (bin, value) once; every bin is then a sorted slice
+        order = np.lexsort((values, bins))
+        sorted_values = values[order]
+        counts = np.bincount(bins, minlength=n_bins)
+        starts = np.cumsum(counts) - counts
+
+        # Linear-interpolated percentiles for all bins and percentiles at once
+        fractions = np.array(AGP_PERCENTILES, dtype=np.float64) / 100
+        positions = starts[:, None] + (np.maximum(counts, 1) - 1)[:, None] * fractions[None, :]
+        lo = np.floor(positions).astype(np.int64)
+        hi = np.minimum(np.ceil(positions).astype(np.int64), len(sorted_values) - 1)
+        lo = np.minimum(lo, len(sorted_values) - 1)
+        bands = sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (positions - lo)
+
+        mean = float(values.mean())
+        std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+        total = len(values)
+
+        def pct(mask) -> float:
+            return round(float(np.count_nonzero(mask)) / total * 100, 1)
+
+        return {
+            "readings": total,
+            "bin_minutes": bin_minutes,
+            "bands": [
+                {
+                    "minute": b * bin_minutes,
+                    "time": f"{b * bin_minutes // 60:02d}:{b * bin_minutes % 60:02d}",
+                    "count": int(counts[b]),
+                    **{
+                        f"p{p}": (round(float(bands[b, j]), 1) if counts[b] else None)
+                        for j, p in enumerate(AGP_PERCENTILES)
+                    },
+                }
+                for b in range(n_bins)
+            ],
+            "mean_glucose": round(mean, 1),
+            "gmi": round(3.31 + 0.02392 * mean, 2),
+            "cv": round(std / mean * 100, 1) if mean else 0.0,
+            "time_in_range": pct((values >= 70) & (values <= 180)),
+            "time_below_range": pct(values < 70),
+            "time_very_low": pct(values < 54),
+            "time_above_range": pct(values > 180),
+            "time_very_high": pct(values > 250),
+        }
+
+
+# Singleton instance
+glucose_analytics = GlucoseAnalytics()
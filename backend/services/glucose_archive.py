@@ -0,0 +1,316 @@
+import mmap
+import os
+import struct
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, distinct, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import GlucoseReading
+
+MAGIC = b"DPGA"
+VERSION = 1
+HEADER = struct.Struct("<4sBI")  # magic, version, record count
+EPOCH = datetime(1970, 1, 1)
+# A directory listed this soon after it changed may miss a write made in
+# the same mtime tick, so such listings are not cached
+RACY_MTIME_NS = 1_000_000_000
+
+
+class ArchivedReading(NamedTuple):
+    id: int
+    user_id: int
+    value: float
+    timestamp: datetime
+    source: str
+    notes: Optional[str]
+
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _put_signed(out: bytearray, n: int) -> None:
+    _put_varint(out, (n << 1) ^ (n >> 63))  # zigzag
+
+
+def _get_varint(buf, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _get_signed(buf, pos: int) -> Tuple[int, int]:
+    n, pos = _get_varint(buf, pos)
+    return (n >> 1) ^ -(n & 1), pos
+
+
+def encode_segment(readings: List[ArchivedReading]) -> bytes:
+    """
+    Pack one patient-day of readings (sorted by timestamp, id).
+
+    Layout: header, source table, then per record the zigzag varint deltas
+    of id, timestamp (ms) and value (0.1 mg/dL) plus a source index,
+    followed by a sparse (record index, text) table for notes.
+    """
+    sources = sorted({r.source or "" for r in readings})
+    source_index = {s: i for i, s in enumerate(sources)}
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(readings)))
+    _put_varint(out, len(sources))
+    for source in sources:
+        encoded = source.encode()
+        _put_varint(out, len(encoded))
+        out += encoded
+
+    prev_id = prev_ms = prev_value = 0
+    for r in readings:
+        ms = int((r.timestamp - EPOCH).total_seconds() * 1000)
+        value = int(round(r.value * 10))
+        _put_signed(out, r.id - prev_id)
+        _put_signed(out, ms - prev_ms)
+        _put_signed(out, value - prev_value)
+        _put_varint(out, source_index[r.source or ""])
+        prev_id, prev_ms, prev_value = r.id, ms, value
+
+    notes = [(i, r.notes.encode()) for i, r in enumerate(readings) if r.notes]
+    _put_varint(out, len(notes))
+    for i, encoded in notes:
+        _put_varint(out, i)
+        _put_varint(out, len(encoded))
+        out += encoded
+
+    return bytes(out)
+
+
+def decode_segment(buf, user_id: int) -> List[ArchivedReading]:
+    """Unpack a segment produced by encode_segment."""
+    magic, version, count = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a glucose archive segment")
+    pos = HEADER.size
+
+    n_sources, pos = _get_varint(buf, pos)
+    sources = []
+    for _ in range(n_sources):
+        length, pos = _get_varint(buf, pos)
+        sources.append(bytes(buf[pos:pos + length]).decode())
+        pos += length
+
+    records = []
+    row_id = ms = value = 0
+    for _ in range(count):
+        delta, pos = _get_signed(buf, pos)
+        row_id += delta
+        delta, pos = _get_signed(buf, pos)
+        ms += delta
+        delta, pos = _get_signed(buf, pos)
+        value += delta
+        source, pos = _get_varint(buf, pos)
+        records.append([row_id, ms, value, sources[source], None])
+
+    n_notes, pos = _get_varint(buf, pos)
+    for _ in range(n_notes):
+        i, pos = _get_varint(buf, pos)
+        length, pos = _get_varint(buf, pos)
+        records[i][4] = bytes(buf[pos:pos + length]).decode()
+        pos += length
+
+    return [
+        ArchivedReading(
+            id=row_id,
+            user_id=user_id,
+            value=value / 10,
+            timestamp=EPOCH + timedelta(milliseconds=ms),
+            source=source,
+            notes=notes
+        )
+        for row_id, ms, value, source, notes in records
+    ]
+
+
+class GlucoseArchive:
+    """
+    Cold-storage tier for old glucose readings.
+
+    Each patient-day is one delta-encoded segment file on local disk
+    (<ARCHIVE_DIR>/<user_id>/<YYYYMMDD>.seg), read through mmap. Values are
+    kept to 0.1 mg/dL and timestamps to the millisecond. Rollups are not
+    touched when readings move here, so window statistics are unaffected.
+
+    All methods do file IO; request handlers call them via asyncio.to_thread.
+    """
+
+    def __init__(self, root: str = settings.ARCHIVE_DIR):
+        self.root = root
+        # user_id -> (directory mtime, archived days); any process adding a
+        # segment bumps the mtime, so a stat replaces the listdir
+        self._days: Dict[int, Tuple[int, List[date]]] = {}
+
+    def _path(self, user_id: int, day: date) -> str:
+        return os.path.join(self.root, str(user_id), f"{day:%Y%m%d}.seg")
+
+    def days(self, user_id: int) -> List[date]:
+        """Archived days for a patient, oldest first."""
+        directory = os.path.join(self.root, str(user_id))
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        cached = self._days.get(user_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        days = sorted(
+            datetime.strptime(name[:-4], "%Y%m%d").date()
+            for name in os.listdir(directory)
+            if name.endswith(".seg")
+        )
+        if time.time_ns() - mtime > RACY_MTIME_NS:
+            self._days[user_id] = (mtime, days)
+        return days
+
+    def users(self) -> List[int]:
+        """Patients with at least one archived segment."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(name) for name in os.listdir(self.root) if name.isdigit())
+
+    def read_day(self, user_id: int, day: date) -> List[ArchivedReading]:
+        """All archived readings of one patient-day, sorted by (timestamp, id)."""
+        path = self._path(user_id, day)
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return decode_segment(buf, user_id)
+
+    def write_day(self, user_id: int, day: date, readings: List[ArchivedReading]) -> None:
+        """Merge readings into a patient-day segment (atomic replace)."""
+        merged = {r.id: r for r in self.read_day(user_id, day)}
+        merged.update((r.id, r) for r in readings)
+        ordered = sorted(merged.values(), key=lambda r: (r.timestamp, r.id))
+
+        path = self._path(user_id, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encode_segment(ordered))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def max_id(self) -> int:
+        """Highest reading id in the archive (0 if empty); reads every segment."""
+        return max(
+            (r.id for user_id in self.users() for day in self.days(user_id) for r in self.read_day(user_id, day)),
+            default=0
+        )
+
+    def newest_day(self, user_id: int) -> Optional[date]:
+        days = self.days(user_id)
+        return days[-1] if days else None
+
+    def iter_range(self, user_id: int, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Iterator[ArchivedReading]:
+        """Archived readings with start <= timestamp < end, oldest first."""
+        for day in self.days(user_id):
+            if start and day < start.date():
+                continue
+            if end and day > end.date():
+                break
+            for r in self.read_day(user_id, day):
+                if (start is None or r.timestamp >= start) and (end is None or r.timestamp < end):
+                    yield r
+
+    def page_desc(self, user_id: int, before: Optional[Tuple[datetime, int]],
+                  limit: int) -> List[ArchivedReading]:
+        """Up to limit archived readings newest first, strictly before a (timestamp, id) key."""
+        return list(islice(self.iter_desc(user_id, before), limit))
+
+    def iter_desc(self, user_id: int,
+                  before: Optional[Tuple[datetime, int]] = None) -> Iterator[ArchivedReading]:
+        """Archived readings newest first, strictly before a (timestamp, id) key."""
+        for day in reversed(self.days(user_id)):
+            if before and day > before[0].date():
+                continue
+            for r in reversed(self.read_day(user_id, day)):
+                if before is None or (r.timestamp, r.id) < before:
+                    yield r
+
+    def archive_older_than(self, db: Session, cutoff: datetime, batch_size: int = 500) -> int:
+        """
+        Move readings older than cutoff out of glucose_readings.
+
+        Whole patient-days are written to segments first, then the rows
+        are deleted by id, so a crash in between only leaves duplicates
+        that the next run merges away.
+
+        Returns:
+            Number of readings archived
+        """
+        moved = 0
+        user_ids = db.scalars(
+            select(distinct(GlucoseReading.user_id)).where(GlucoseReading.timestamp < cutoff)
+        ).all()
+
+        for user_id in user_ids:
+            rows = db.execute(
+                select(
+                    GlucoseReading.id,
+                    GlucoseReading.value,
+                    GlucoseReading.timestamp,
+                    GlucoseReading.source,
+                    GlucoseReading.notes
+                ).where(
+                    GlucoseReading.user_id == user_id,
+                    GlucoseReading.timestamp < cutoff
+                ).order_by(GlucoseReading.timestamp, GlucoseReading.id)
+            ).all()
+
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(row.timestamp.date(), []).append(ArchivedReading(
+                    id=row.id,
+                    user_id=user_id,
+                    value=row.value,
+                    timestamp=row.timestamp,
+                    source=row.source,
+                    notes=row.notes
+                ))
+            for day, readings in by_day.items():
+                self.write_day(user_id, day, readings)
+
+            ids = [row.id for row in rows]
+            for i in range(0, len(ids), batch_size):
+                db.execute(delete(GlucoseReading).where(GlucoseReading.id.in_(ids[i:i + batch_size])))
+            db.commit()
+            moved += len(ids)
+
+        return moved
+
+    def run(self, db: Session) -> int:
+        """Archive everything older than ARCHIVE_AFTER_DAYS (whole days)."""
+        if settings.ARCHIVE_AFTER_DAYS <= 0:
+            return 0
+        cutoff = datetime.combine(
+            (datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)).date(),
+            datetime.min.time()
+        )
+        return self.archive_older_than(db, cutoff)
+
+
+# Singleton instance
+glucose_archive = GlucoseArchive()
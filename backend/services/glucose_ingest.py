@@ -0,0 +1,224 @@
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from models import GlucoseReading
+from schemas import CrashGuardResponse, GlucoseReadingCreate, GlucoseReadingResponse
+from services.glucose_rollups import glucose_rollups
+from services.glucose_stats import glucose_stats
+from services.glucose_analytics import glucose_analytics
+from services.glucose_archive import glucose_archive
+from services.glucose_predictor import glucose_predictor
+from services.live_updates import live_updates
+from services.response_cache import response_cache
+from services.risk_profiles import risk_profiles
+
+# Rows per natural-key lookup query (keeps bound parameters well under limits)
+LOOKUP_CHUNK_SIZE = 500
+
+NaturalKey = Tuple[int, datetime, str]
+
+
+class PreparedReadings(NamedTuple):
+    """Normalized rows of a batch plus the ids of those already archived."""
+    rows: List[dict]
+    archived: Dict[NaturalKey, int]
+
+
+def _natural_key(row: dict) -> NaturalKey:
+    return row["user_id"], row["timestamp"], row["source"]
+
+
+def _utc_naive(ts: datetime) -> datetime:
+    """Timestamps are stored as naive UTC."""
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+class GlucoseIngestor:
+    """
+    Service for persisting glucose readings.
+    Single readings and CGM batches share the same write path. A reading
+    is identified by (user_id, timestamp, source), so bridges that retry
+    or resend overlapping windows do not create duplicate rows.
+
+    Request handlers run prepare() (archive file IO) via asyncio.to_thread
+    and store() on their session; sync callers use ingest() for both.
+    """
+
+    def ingest(self, db: Session, readings: List[GlucoseReadingCreate], publish: bool = True) -> List[dict]:
+        """
+        Insert readings in a single transaction, skipping ones already stored.
+
+        Args:
+            db: Database session
+            readings: Validated readings to store
+            publish: Push the new readings to live (SSE) clients; off for
+                history imports
+
+        Returns:
+            One row per input reading (same order) with its id and a
+            "duplicate" flag; duplicates carry the id of the stored row
+        """
+        return self.store(db, self.prepare(readings), publish)
+
+    def prepare(self, readings: List[GlucoseReadingCreate]) -> PreparedReadings:
+        """Normalize readings and look up the ones already archived (no database access)."""
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": r.user_id,
+                "value": r.value,
+                "timestamp": _utc_naive(r.timestamp) if r.timestamp else now,
+                "source": r.source or "manual",
+                "notes": r.notes,
+            }
+            for r in readings
+        ]
+        return PreparedReadings(rows, self._archived_ids(rows))
+
+    def store(self, db: Session, prepared: PreparedReadings, publish: bool = True) -> List[dict]:
+        """Store prepared readings; see ingest()."""
+        rows = prepared.rows
+        if not rows:
+            return []
+
+        # Repeats inside the batch collapse onto their first occurrence
+        first: Dict[NaturalKey, dict] = {}
+        for row in rows:
+            first.setdefault(_natural_key(row), row)
+
+        known = dict(prepared.archived)
+        candidates = [row for key, row in first.items() if key not in known]
+        inserted = self._insert_new(db, candidates)
+        known.update(self._stored_ids(db, [row for row in candidates if _natural_key(row) not in inserted]))
+
+        created = []
+        for row in rows:
+            key = _natural_key(row)
+            if key in inserted and first[key] is row:
+                row["id"], row["duplicate"] = inserted[key], False
+                created.append(row)
+            else:
+                row["id"], row["duplicate"] = inserted.get(key) or known[key], True
+
+        # Rollups and forecast filters are updated in the same transaction
+        # as the raw rows
+        glucose_rollups.apply(db, created)
+        glucose_predictor.update_states(db, created)
+        db.commit()
+
+        # In-memory state only sees committed, newly stored readings
+        if created:
+            glucose_stats.add_many(created)
+            glucose_analytics.invalidate(row["user_id"] for row in created)
+            response_cache.invalidate(row["user_id"] for row in created)
+            risk_profiles.mark_changed(row["user_id"] for row in created)
+            if publish:
+                self._publish(db, created)
+
+        return rows
+
+    def _insert_new(self, db: Session, rows: List[dict]) -> Dict[NaturalKey, int]:
+        """Insert rows whose natural key is not stored yet; returns their new ids."""
+        if not rows:
+            return {}
+        columns = ["user_id", "value", "timestamp", "source", "notes"]
+        values = [{c: row[c] for c in columns} for row in rows]
+        dialect = db.bind.dialect.name
+
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+            # One multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING; rows
+            # that hit the natural key are simply absent from the result
+            stmt = dialect_insert(GlucoseReading).on_conflict_do_nothing(
+                index_elements=["user_id", "timestamp", "source"]
+            ).returning(
+                GlucoseReading.id, GlucoseReading.user_id,
+                GlucoseReading.timestamp, GlucoseReading.source
+            )
+            return {(r.user_id, r.timestamp, r.source): r.id for r in db.execute(stmt, values)}
+
+        existing = self._stored_ids(db, rows)
+        fresh = [(row, v) for row, v in zip(rows, values) if _natural_key(row) not in existing]
+        if not fresh:
+            return {}
+        ids = db.scalars(
+            insert(GlucoseReading).returning(GlucoseReading.id, sort_by_parameter_order=True),
+            [v for _, v in fresh]
+        ).all()
+        return {_natural_key(row): row_id for (row, _), row_id in zip(fresh, ids)}
+
+    def _stored_ids(self, db: Session, rows: List[dict]) -> Dict[NaturalKey, int]:
+        """Ids of rows already in glucose_readings, by natural key."""
+        found = {}
+        for i in range(0, len(rows), LOOKUP_CHUNK_SIZE):
+            chunk = rows[i:i + LOOKUP_CHUNK_SIZE]
+            wanted = {_natural_key(row) for row in chunk}
+            result = db.execute(
+                select(
+                    GlucoseReading.id, GlucoseReading.user_id,
+                    GlucoseReading.timestamp, GlucoseReading.source
+                ).where(
+                    GlucoseReading.user_id.in_({row["user_id"] for row in chunk}),
+                    GlucoseReading.timestamp.in_({row["timestamp"] for row in chunk})
+                )
+            )
+            for r in result:
+                key = (r.user_id, r.timestamp, r.source)
+                if key in wanted:
+                    found[key] = r.id
+        return found
+
+    def _archived_ids(self, rows: List[dict]) -> Dict[NaturalKey, int]:
+        """Ids of rows already moved to the cold archive, by natural key."""
+        found = {}
+        newest = {}
+        by_day: Dict[tuple, List[dict]] = {}
+        for row in rows:
+            user_id = row["user_id"]
+            if user_id not in newest:
+                newest[user_id] = glucose_archive.newest_day(user_id)
+            day = row["timestamp"].date()
+            if newest[user_id] is not None and day <= newest[user_id]:
+                by_day.setdefault((user_id, day), []).append(row)
+
+        for (user_id, day), day_rows in by_day.items():
+            # Segments keep millisecond timestamps
+            archived = {
+                (r.timestamp, r.source): r.id for r in glucose_archive.read_day(user_id, day)
+            }
+            for row in day_rows:
+                ts = row["timestamp"]
+                row_id = archived.get((ts.replace(microsecond=ts.microsecond // 1000 * 1000), row["source"]))
+                if row_id is not None:
+                    found[_natural_key(row)] = row_id
+        return found
+
+    def _publish(self, db: Session, rows: List[dict]) -> None:
+        """Push new readings and a fresh crash-guard assessment to live clients."""
+        by_user = {}
+        for row in rows:
+            if live_updates.has_subscribers(row["user_id"]):
+                by_user.setdefault(row["user_id"], []).append(row)
+
+        for user_id, user_rows in by_user.items():
+            events = [
+                ("reading", GlucoseReadingResponse(**row).model_dump_json())
+                for row in user_rows
+            ]
+            assessment = glucose_predictor.crash_guard(db, user_id)
+            if assessment is not None:
+                events.append(("crash-guard", CrashGuardResponse(**assessment).model_dump_json()))
+            live_updates.publish(user_id, events)
+
+
+# Singleton instance
+glucose_ingestor = GlucoseIngestor()
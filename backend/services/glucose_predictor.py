@@ -1,17 +1,107 @@
 import random
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import GlucoseForecastState, GlucoseReading
+
+BASELINE = 100.0  # mg/dL the stateless forecast returns to
+FORECAST_STEP_MINUTES = 30
+TREND_DECAY_MINUTES = 30.0  # time constant with which forecasts damp the trend
+HYPO_THRESHOLD = 70.0  # mg/dL
+CGM_RANGE = (40.0, 400.0)  # values CGMs report; forecasts are clipped to it
+
+# Level + trend Kalman filter
+MEASUREMENT_VAR = 5.0 ** 2  # CGM sensor noise, (mg/dL)^2
+ACCEL_VAR = 0.1 ** 2  # drift of the trend, (mg/dL per minute^2)^2
+INITIAL_TREND_VAR = 1.0  # trend uncertainty of a fresh filter, (mg/dL per minute)^2
+RESET_GAP_MINUTES = 60  # a gap this long restarts the filter
+
+
+class _ForecastState:
+    """
+    Level + trend Kalman filter of one patient's glucose: a constant-rate
+    model whose rate drifts as white noise, updated in O(1) per reading.
+    """
+
+    __slots__ = ("level", "trend", "var_level", "cov_level_trend", "var_trend", "last_time", "last_value")
+
+    def __init__(self, timestamp: datetime, value: float):
+        self.reset(timestamp, value)
+
+    @classmethod
+    def from_row(cls, row) -> "_ForecastState":
+        state = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(state, name, getattr(row, name))
+        return state
+
+    def as_row(self, user_id: int) -> dict:
+        return {"user_id": user_id, **{name: getattr(self, name) for name in self.__slots__}}
+
+    def reset(self, timestamp: datetime, value: float) -> None:
+        self.level = value
+        self.trend = 0.0
+        self.var_level = MEASUREMENT_VAR
+        self.cov_level_trend = 0.0
+        self.var_trend = INITIAL_TREND_VAR
+        self.last_time = timestamp
+        self.last_value = value
+
+    def push(self, timestamp: datetime, value: float) -> bool:
+        """
+        Fold in a reading newer than the last one.
+
+        Returns:
+            False if the reading is not newer (the filter never rewinds)
+        """
+        dt = (timestamp - self.last_time).total_seconds() / 60
+        if dt <= 0:
+            return False
+        if dt >= RESET_GAP_MINUTES:
+            self.reset(timestamp, value)
+            return True
+
+        # Predict: level moves with the trend, uncertainty grows with dt
+        level = self.level + self.trend * dt
+        var_level = (self.var_level + 2 * dt * self.cov_level_trend + dt * dt * self.var_trend
+                     + ACCEL_VAR * dt ** 3 / 3)
+        cov = self.cov_level_trend + dt * self.var_trend + ACCEL_VAR * dt ** 2 / 2
+        var_trend = self.var_trend + ACCEL_VAR * dt
+
+        # Update with the measured level
+        innovation_var = var_level + MEASUREMENT_VAR
+        gain_level = var_level / innovation_var
+        gain_trend = cov / innovation_var
+        innovation = value - level
+
+        self.level = level + gain_level * innovation
+        self.trend += gain_trend * innovation
+        self.var_level = (1 - gain_level) * var_level
+        self.cov_level_trend = (1 - gain_level) * cov
+        self.var_trend = var_trend - gain_trend * cov
+        self.last_time = timestamp
+        self.last_value = value
+        return True
 
 
 class GlucosePredictor:
     """
     Service for predicting glucose values.
     Uses simple time-series forecasting (average accuracy implementation).
+    Per-patient forecasts and hypoglycemia risk come from a level + trend
+    Kalman filter that the ingest path advances with every new reading and
+    stores in glucose_forecast_states.
     """
     
     def predict_next_hours(self, current_value: float, hours: int = 3) -> List[dict]:
         """
-        Predict glucose values for the next N hours.
+        Predict glucose values for the next N hours without a forecast
+        filter (patients without recent readings): a linear glide to the
+        100 mg/dL baseline with +/-5 mg/dL noise.
         
         Args:
             current_value: Current glucose value in mg/dL
@@ -20,33 +110,62 @@ class GlucosePredictor:
         Returns:
             List of predictions with time and value
         """
+        minutes = self.horizons(hours)
+        forecast = (current_value + (BASELINE - current_value) * minutes / minutes[-1]
+                    + np.random.uniform(-5, 5, size=len(minutes)))
+        return self._points(current_value, np.round(forecast, 1), hours)
+    
+    def _points(self, current_value: float, forecast: np.ndarray, hours: int) -> List[dict]:
+        """Forecast row as GlucosePrediction dicts, starting with "Now"."""
         predictions = [{"time": "Now", "value": current_value, "predicted": False}]
-        
-        # Simple prediction: gradual return to baseline (100 mg/dL)
-        baseline = 100
-        intervals = hours * 2  # Every 30 minutes
-        
-        for i in range(1, intervals + 1):
-            # Calculate time offset
-            time_offset = i * 30  # minutes
-            time_label = f"+{time_offset}m" if time_offset < 60 else f"+{time_offset // 60}h"
-            
-            # Predict value (gradual approach to baseline with some noise)
-            progress = i / intervals
-            predicted_value = current_value + (baseline - current_value) * progress
-            
-            # Add realistic noise
-            noise = random.uniform(-5, 5)
-            predicted_value += noise
-            
+        for minutes, value in zip(self.horizons(hours), forecast):
             predictions.append({
-                "time": time_label,
-                "value": round(predicted_value, 1),
+                "time": f"+{minutes}m" if minutes < 60 else f"+{minutes // 60}h",
+                "value": float(value),
                 "predicted": True
             })
         
         return predictions
     
+    @staticmethod
+    def horizons(hours: int = 3) -> np.ndarray:
+        """Forecast horizons in minutes (every 30 minutes)."""
+        return np.arange(1, hours * 2 + 1) * FORECAST_STEP_MINUTES
+    
+    @staticmethod
+    def project(level, trend, minutes):
+        """
+        Damped-trend projection of a filter state: the trend carries on and
+        decays with TREND_DECAY_MINUTES, so the level moves at most
+        trend * TREND_DECAY_MINUTES. Works elementwise on arrays.
+        
+        Returns:
+            Tuple of (level, trend) minutes after the state
+        """
+        decay = np.exp(-np.asarray(minutes, dtype=float) / TREND_DECAY_MINUTES)
+        return level + trend * TREND_DECAY_MINUTES * (1 - decay), trend * decay
+    
+    def predict_batch(self, level: np.ndarray, trend: np.ndarray, elapsed: np.ndarray,
+                      hours: int = 3) -> np.ndarray:
+        """
+        Forecast many patients at once from their filter states.
+        
+        Args:
+            level: Filtered glucose per patient at its last reading, shape (n,)
+            trend: Filtered rate of change in mg/dL per minute, shape (n,)
+            elapsed: Minutes from each last reading to now, shape (n,)
+            hours: Number of hours to predict
+            
+        Returns:
+            Array of shape (n, hours * 2), one column per horizons() entry
+            counted from now, clipped to the CGM reporting range
+        """
+        minutes = np.asarray(elapsed, dtype=float)[:, None] + self.horizons(hours)[None, :]
+        forecast, _ = self.project(
+            np.asarray(level, dtype=float)[:, None], np.asarray(trend, dtype=float)[:, None], minutes
+        )
+        return np.round(np.clip(forecast, *CGM_RANGE), 1)
+    
     def simulate_scenario(self, current_value: float, scenario: str,
                          meal_carbs: float = None,
                          exercise_duration: int = None) -> List[dict]:
@@ -99,36 +218,255 @@ class GlucosePredictor:
         
         return results
     
-    def check_hypo_risk(self, current_value: float,
-                       recent_values: List[float]) -> Tuple[str, str, float]:
+    def check_hypo_risk(self, current: float, level: float, trend: float) -> Tuple[str, Optional[str], float]:
         """
         Check risk of hypoglycemia.
         
         Args:
-            current_value: Current glucose reading
-            recent_values: List of recent glucose values
+            current: Latest measured glucose in mg/dL
+            level: Filtered glucose projected to now, in mg/dL
+            trend: Filtered rate of change in mg/dL per minute
             
         Returns:
-            Tuple of (risk_level, estimated_time, predicted_value)
+            Tuple of (risk_level, estimated_time, predicted_value), the
+            prediction being the 30-minute forecast
         """
-        # High risk if current < 70 or rapid decline
-        if current_value < 70:
-            return "high", "Now", current_value
+        predicted = round(float(np.clip(self.project(level, trend, 30)[0], *CGM_RANGE)), 1)
+        
+        # High risk if already low (the filter lags a sudden drop)
+        if current < HYPO_THRESHOLD:
+            return "high", "Now", predicted
+        
+        # Time until the damped trend crosses the threshold, if it ever does
+        drop, max_drop = level - HYPO_THRESHOLD, -trend * TREND_DECAY_MINUTES
+        if trend < 0 and drop < max_drop:
+            minutes = max(5, round(-TREND_DECAY_MINUTES * float(np.log(1 - drop / max_drop)) / 5) * 5)
+            if minutes <= 20:
+                return "high", f"~{minutes} min", predicted
+            if minutes <= 60:
+                return "medium", f"~{minutes} min", predicted
         
-        # Check trend
-        if len(recent_values) >= 2:
-            trend = recent_values[-1] - recent_values[-2]
+        if current < 80:
+            return "medium", "~45-60 min", predicted
+        
+        return "low", None, predicted
+    
+    def load_state(self, db: Session, user_id: int,
+                   now: Optional[datetime] = None) -> Optional[Tuple[_ForecastState, float]]:
+        """
+        A patient's stored forecast filter.
+        
+        Returns:
+            Tuple of (state, minutes since its last reading), or None if the
+            patient has no readings
+        """
+        row = db.execute(
+            select(*GlucoseForecastState.__table__.c).where(GlucoseForecastState.user_id == user_id)
+        ).first()
+        if row is None:
+            return None
+        elapsed = max(((now or datetime.utcnow()) - row.last_time).total_seconds() / 60, 0.0)
+        return _ForecastState.from_row(row), elapsed
+    
+    def update_states(self, db: Session, rows: Iterable[dict]) -> int:
+        """
+        Advance the forecast filters of patients with new readings (caller commits).
+        Readings older than a patient's newest folded-in reading are skipped.
+        
+        Args:
+            db: Database session
+            rows: Stored readings with user_id, value and timestamp
+            
+        Returns:
+            Number of filters written
+        """
+        by_user: Dict[int, List[dict]] = {}
+        for row in sorted(rows, key=lambda r: (r["user_id"], r["timestamp"])):
+            by_user.setdefault(row["user_id"], []).append(row)
+        if not by_user:
+            return 0
+        
+        states = {
+            row.user_id: _ForecastState.from_row(row)
+            for row in db.execute(
+                select(*GlucoseForecastState.__table__.c)
+                .where(GlucoseForecastState.user_id.in_(list(by_user)))
+            )
+        }
+        
+        changed = []
+        for user_id, user_rows in by_user.items():
+            state = states.get(user_id)
+            advanced = state is None
+            for row in user_rows:
+                if state is None:
+                    state = _ForecastState(row["timestamp"], row["value"])
+                else:
+                    advanced = state.push(row["timestamp"], row["value"]) or advanced
+            if advanced:
+                changed.append(state.as_row(user_id))
+        
+        if changed:
+            self._upsert_states(db, changed)
+        return len(changed)
+    
+    def _upsert_states(self, db: Session, rows: List[dict]) -> None:
+        table = GlucoseForecastState.__table__
+        dialect = db.bind.dialect.name
+        
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            for row in rows:
+                db.merge(GlucoseForecastState(**row))
+            return
+        
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={name: stmt.excluded[name] for name in _ForecastState.__slots__}
+        )
+        db.execute(stmt, rows)
+    
+    def rebuild_states(self, db: Session, chunk_size: int = 5000) -> int:
+        """
+        Recompute every forecast filter from the stored readings.
+        
+        Returns:
+            Number of readings folded in
+        """
+        db.query(GlucoseForecastState).delete()
+        
+        processed = 0
+        chunk = []
+        result = db.execute(
+            select(GlucoseReading.user_id, GlucoseReading.value, GlucoseReading.timestamp)
+            .order_by(GlucoseReading.user_id, GlucoseReading.timestamp)
+            .execution_options(yield_per=chunk_size)
+        )
+        for user_id, value, timestamp in result:
+            chunk.append({"user_id": user_id, "value": value, "timestamp": timestamp})
+            if len(chunk) >= chunk_size:
+                self.update_states(db, chunk)
+                processed += len(chunk)
+                chunk = []
+        if chunk:
+            self.update_states(db, chunk)
+            processed += len(chunk)
+        
+        db.commit()
+        return processed
+    
+    def rebuild_states_if_missing(self, db: Session) -> int:
+        """Backfill forecast filters for databases created before they existed."""
+        has_states = db.query(GlucoseForecastState.user_id).first() is not None
+        has_readings = db.query(GlucoseReading.id).first() is not None
+        if has_readings and not has_states:
+            return self.rebuild_states(db)
+        return 0
+    
+    def predict_for_user(self, db: Session, user_id: int, hours: int = 3) -> List[dict]:
+        """
+        Predict a patient's glucose from their forecast filter, projected
+        from the last reading to now.
+        
+        Args:
+            db: Database session
+            user_id: Patient id
+            hours: Number of hours to predict
+            
+        Returns:
+            List of predictions with time and value; only the last reading,
+            labelled with its age, if it is RESET_GAP_MINUTES old or more
+        """
+        loaded = self.load_state(db, user_id)
+        if loaded is None:
+            return self.predict_next_hours(98.0, hours=hours)
+        
+        state, elapsed = loaded
+        if elapsed >= RESET_GAP_MINUTES:
+            return [{"time": self._age_label(elapsed), "value": round(state.last_value, 1), "predicted": False}]
+        
+        forecast = self.predict_batch(
+            np.array([state.level]), np.array([state.trend]), np.array([elapsed]), hours=hours
+        )[0]
+        return self._points(round(state.last_value, 1), forecast, hours)
+    
+    @staticmethod
+    def _age_label(minutes: float) -> str:
+        """Time label of a past reading, e.g. "-75m", "-5h" or "-2d"."""
+        if minutes < 120:
+            return f"-{int(minutes)}m"
+        if minutes < 48 * 60:
+            return f"-{int(minutes // 60)}h"
+        return f"-{int(minutes // (24 * 60))}d"
+    
+    def crash_guard(self, db: Session, user_id: int) -> Optional[dict]:
+        """
+        Build a patient's crash-guard assessment with recommendations.
+        
+        Args:
+            db: Database session
+            user_id: Patient id
             
-            if trend < -10:  # Rapid decline
-                predicted = current_value + (trend * 2)  # Predict 20 min ahead
-                if predicted < 70:
-                    return "high", "~20 min", predicted
-                return "medium", "~30-45 min", predicted
+        Returns:
+            Dict matching CrashGuardResponse, or None if the patient has no
+            readings. Risk is "unknown" when the last reading is
+            RESET_GAP_MINUTES old or more.
+        """
+        loaded = self.load_state(db, user_id)
+        if loaded is None:
+            return None
+        state, elapsed = loaded
+        current = round(state.last_value, 1)
+        
+        if elapsed >= RESET_GAP_MINUTES:
+            recommendations = [
+                "No CGM reading in the last hour - check the sensor",
+                "Confirm glucose with a fingerstick"
+            ]
+            if state.last_value < HYPO_THRESHOLD:
+                recommendations.insert(0, "Last reading was below 70 mg/dL - check glucose now")
+            return {
+                "risk_level": "unknown",
+                "estimated_time": None,
+                "current_glucose": current,
+                "predicted_glucose": None,
+                "reading_age_minutes": int(elapsed),
+                "recommendations": recommendations
+            }
+        
+        level, trend = self.project(state.level, state.trend, elapsed)
+        risk, time_est, predicted = self.check_hypo_risk(state.last_value, float(level), float(trend))
         
-        if current_value < 80:
-            return "medium", "~45-60 min", current_value - 10
+        if risk == "high":
+            recommendations = [
+                "Consume 15g fast-acting carbs immediately",
+                "Recheck glucose in 15 minutes",
+                "Alert emergency contact if < 54 mg/dL"
+            ]
+        elif risk == "medium":
+            recommendations = [
+                "Consider having a small snack",
+                "Monitor closely for next 30 minutes",
+                "Keep fast-acting carbs nearby"
+            ]
+        else:
+            recommendations = [
+                "Glucose levels stable",
+                "Continue normal monitoring"
+            ]
         
-        return "low", None, current_value
+        return {
+            "risk_level": risk,
+            "estimated_time": time_est,
+            "current_glucose": current,
+            "predicted_glucose": predicted,
+            "reading_age_minutes": int(elapsed),
+            "recommendations": recommendations
+        }
 
 
 # Singleton instance
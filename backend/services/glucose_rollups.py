@@ -0,0 +1,352 @@
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, and_, case, false, func, literal, or_, select, true, union_all
+from sqlalchemy.orm import Session
+
+from models import GlucoseReading, GlucoseRollup
+from services.glucose_archive import glucose_archive
+
+FIVE_MINUTES = 300
+HOURLY = 3600
+DAILY = 86400
+RESOLUTIONS = (FIVE_MINUTES, HOURLY, DAILY)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_floor(ts: datetime, resolution: int) -> datetime:
+    """Start of the bucket of the given width that contains ts."""
+    seconds = int((ts - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+def bucket_ceil(ts: datetime, resolution: int) -> datetime:
+    """First bucket boundary at or after ts."""
+    start = bucket_floor(ts, resolution)
+    return start if start == ts else start + timedelta(seconds=resolution)
+
+
+class GlucoseRollupService:
+    """
+    Service for maintaining per-patient glucose rollups.
+    Keeps count, sum, sum of squares, min/max and band counts per
+    5-minute, hourly and daily bucket so window statistics read a few
+    dozen rows instead of every raw reading.
+    """
+
+    def apply(self, db: Session, rows: Iterable[dict]) -> None:
+        """
+        Fold new readings into their rollup buckets (caller commits).
+
+        Args:
+            db: Database session
+            rows: Stored readings with user_id, value and timestamp
+        """
+        buckets: Dict[Tuple[int, int, datetime], dict] = {}
+
+        for row in rows:
+            value = row["value"]
+            for resolution in RESOLUTIONS:
+                key = (row["user_id"], resolution, bucket_floor(row["timestamp"], resolution))
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = {
+                        "user_id": key[0],
+                        "resolution": resolution,
+                        "bucket_start": key[2],
+                        "count": 0,
+                        "total": 0.0,
+                        "total_sq": 0.0,
+                        "min_value": value,
+                        "max_value": value,
+                        "hypo_count": 0,
+                        "in_range_count": 0,
+                        "hyper_count": 0,
+                    }
+                bucket["count"] += 1
+                bucket["total"] += value
+                bucket["total_sq"] += value * value
+                bucket["min_value"] = min(bucket["min_value"], value)
+                bucket["max_value"] = max(bucket["max_value"], value)
+                if value < 70:
+                    bucket["hypo_count"] += 1
+                elif value > 180:
+                    bucket["hyper_count"] += 1
+                else:
+                    bucket["in_range_count"] += 1
+
+        if buckets:
+            self._upsert(db, list(buckets.values()))
+
+    def _upsert(self, db: Session, buckets: List[dict]) -> None:
+        """Merge partial buckets into the stored ones."""
+        table = GlucoseRollup.__table__
+        dialect = db.bind.dialect.name
+
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            self._merge_fallback(db, buckets)
+            return
+
+        stmt = insert(table)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.resolution, table.c.bucket_start],
+            set_={
+                "count": table.c.count + excluded.count,
+                "total": table.c.total + excluded.total,
+                "total_sq": table.c.total_sq + excluded.total_sq,
+                "min_value": case(
+                    (excluded.min_value < table.c.min_value, excluded.min_value),
+                    else_=table.c.min_value
+                ),
+                "max_value": case(
+                    (excluded.max_value > table.c.max_value, excluded.max_value),
+                    else_=table.c.max_value
+                ),
+                "hypo_count": table.c.hypo_count + excluded.hypo_count,
+                "in_range_count": table.c.in_range_count + excluded.in_range_count,
+                "hyper_count": table.c.hyper_count + excluded.hyper_count,
+            }
+        )
+        db.execute(stmt, buckets)
+
+    def _merge_fallback(self, db: Session, buckets: List[dict]) -> None:
+        """Read-modify-write merge for databases without ON CONFLICT."""
+        for bucket in buckets:
+            existing = db.query(GlucoseRollup).filter(
+                GlucoseRollup.user_id == bucket["user_id"],
+                GlucoseRollup.resolution == bucket["resolution"],
+                GlucoseRollup.bucket_start == bucket["bucket_start"]
+            ).with_for_update().first()
+
+            if existing is None:
+                db.add(GlucoseRollup(**bucket))
+                continue
+
+            existing.count += bucket["count"]
+            existing.total += bucket["total"]
+            existing.total_sq += bucket["total_sq"]
+            existing.min_value = min(existing.min_value, bucket["min_value"])
+            existing.max_value = max(existing.max_value, bucket["max_value"])
+            existing.hypo_count += bucket["hypo_count"]
+            existing.in_range_count += bucket["in_range_count"]
+            existing.hyper_count += bucket["hyper_count"]
+
+    @staticmethod
+    def _window_ranges(since: datetime, until: datetime) -> List[Tuple[int, datetime, datetime]]:
+        """
+        Cover [since, until) with the coarsest buckets that fit.
+
+        Returns:
+            List of (resolution, first bucket_start, last bucket_start exclusive)
+        """
+        start = bucket_floor(since, FIVE_MINUTES)
+        first_hour = bucket_ceil(start, HOURLY)
+        first_day = bucket_ceil(first_hour, DAILY)
+        last_day = bucket_floor(until, DAILY)
+        last_hour = bucket_floor(until, HOURLY)
+
+        if first_day <= last_day:
+            ranges = [
+                (FIVE_MINUTES, start, first_hour),
+                (HOURLY, first_hour, first_day),
+                (DAILY, first_day, last_day),
+                (HOURLY, last_day, last_hour),
+                (FIVE_MINUTES, last_hour, until),
+            ]
+        elif first_hour <= last_hour:
+            ranges = [
+                (FIVE_MINUTES, start, first_hour),
+                (HOURLY, first_hour, last_hour),
+                (FIVE_MINUTES, last_hour, until),
+            ]
+        else:
+            ranges = [(FIVE_MINUTES, start, until)]
+
+        return [r for r in ranges if r[1] < r[2]]
+
+    def window_stats(self, db: Session, user_id: int, since: datetime,
+                     until: Optional[datetime] = None) -> Optional[dict]:
+        """
+        Aggregate a patient's rollups over a time window.
+
+        Args:
+            db: Database session
+            user_id: Patient id
+            since: Window start (rounded down to 5 minutes)
+            until: Window end, defaults to now
+
+        Returns:
+            Dict with count, mean, std_dev, time_in_range, hypo/hyper counts,
+            min and max, or None if there are no readings in the window
+        """
+        until = until or datetime.utcnow()
+        ranges = self._window_ranges(since, until)
+        if not ranges:
+            return None
+
+        row = db.execute(
+            select(*self.window_sums()).where(
+                GlucoseRollup.user_id == user_id,
+                self._window_filter(ranges)
+            )
+        ).one()
+
+        count = row[0] or 0
+        if not count:
+            return None
+
+        return self.summarize(*row)
+
+    def window_stats_by_user(self, db: Session, user_ids: List[int], since: datetime,
+                             until: Optional[datetime] = None) -> Dict[int, dict]:
+        """
+        Aggregate several patients' rollups over one time window in a single
+        grouped query.
+
+        Returns:
+            Dict of user_id -> window_stats dict, for patients with readings
+            in the window
+        """
+        until = until or datetime.utcnow()
+        ranges = self._window_ranges(since, until)
+        if not ranges or not user_ids:
+            return {}
+
+        rows = db.execute(
+            select(GlucoseRollup.user_id, *self.window_sums()).where(
+                GlucoseRollup.user_id.in_(user_ids),
+                self._window_filter(ranges)
+            ).group_by(GlucoseRollup.user_id)
+        ).all()
+
+        return {row[0]: self.summarize(*row[1:]) for row in rows if row[1]}
+
+    @staticmethod
+    def window_sums() -> list:
+        """Rollup columns summed over a window, in summarize() argument order."""
+        return [
+            func.sum(GlucoseRollup.count),
+            func.sum(GlucoseRollup.total),
+            func.sum(GlucoseRollup.total_sq),
+            func.min(GlucoseRollup.min_value),
+            func.max(GlucoseRollup.max_value),
+            func.sum(GlucoseRollup.hypo_count),
+            func.sum(GlucoseRollup.in_range_count),
+            func.sum(GlucoseRollup.hyper_count),
+        ]
+
+    def join_window(self, query, user_id_col, since: datetime, until: Optional[datetime] = None):
+        """
+        Left-join a patient query to each patient's rollups over a time
+        window, for aggregating window_sums() across many patients in one
+        grouped query.
+
+        The window's bucket ranges are joined as a small derived table, so
+        every lookup is a (user_id, resolution, bucket_start) range seek;
+        an OR of the ranges in the join condition would only use user_id.
+
+        Args:
+            query: select() over the patients, grouped by the caller
+            user_id_col: Column holding the patient id in query
+            since: Window start (rounded down to 5 minutes)
+            until: Window end, defaults to now
+        """
+        ranges = self._window_ranges(since, until or datetime.utcnow())
+        if not ranges:
+            return query.outerjoin(GlucoseRollup, false())
+
+        windows = union_all(*[
+            select(
+                literal(resolution, Integer).label("resolution"),
+                literal(lo, DateTime).label("lo"),
+                literal(hi, DateTime).label("hi")
+            )
+            for resolution, lo, hi in ranges
+        ]).subquery("windows")
+
+        return query.join(windows, true()).outerjoin(GlucoseRollup, and_(
+            GlucoseRollup.user_id == user_id_col,
+            GlucoseRollup.resolution == windows.c.resolution,
+            GlucoseRollup.bucket_start >= windows.c.lo,
+            GlucoseRollup.bucket_start < windows.c.hi
+        ))
+
+    @staticmethod
+    def _window_filter(ranges: List[Tuple[int, datetime, datetime]]):
+        return or_(*[
+            and_(
+                GlucoseRollup.resolution == resolution,
+                GlucoseRollup.bucket_start >= lo,
+                GlucoseRollup.bucket_start < hi
+            )
+            for resolution, lo, hi in ranges
+        ])
+
+    @staticmethod
+    def summarize(count: int, total: float, total_sq: float, min_value: float,
+                  max_value: float, hypo: int, in_range: int, hyper: int) -> dict:
+        """Turn summed rollup columns into window statistics."""
+        mean = total / count
+        variance = max(total_sq / count - mean * mean, 0.0)
+        return {
+            "count": count,
+            "mean": mean,
+            "std_dev": variance ** 0.5,
+            "min": min_value,
+            "max": max_value,
+            "time_in_range": in_range / count * 100,
+            "hypo_events": hypo,
+            "hyper_events": hyper,
+        }
+
+    def rebuild(self, db: Session, chunk_size: int = 5000) -> int:
+        """
+        Recompute all rollups from raw and archived readings.
+
+        Returns:
+            Number of readings folded in
+        """
+        db.query(GlucoseRollup).delete()
+
+        processed = 0
+        chunk = []
+        result = db.execute(
+            select(GlucoseReading.user_id, GlucoseReading.value, GlucoseReading.timestamp)
+            .execution_options(yield_per=chunk_size)
+        )
+        archived = (
+            (r.user_id, r.value, r.timestamp)
+            for user_id in glucose_archive.users()
+            for r in glucose_archive.iter_range(user_id)
+        )
+        for user_id, value, timestamp in chain(result, archived):
+            chunk.append({"user_id": user_id, "value": value, "timestamp": timestamp})
+            if len(chunk) >= chunk_size:
+                self.apply(db, chunk)
+                processed += len(chunk)
+                chunk = []
+        if chunk:
+            self.apply(db, chunk)
+            processed += len(chunk)
+
+        db.commit()
+        return processed
+
+    def rebuild_if_missing(self, db: Session) -> int:
+        """Backfill rollups for databases created before they existed."""
+        has_rollups = db.query(GlucoseRollup.id).first() is not None
+        has_readings = db.query(GlucoseReading.id).first() is not None
+        if has_readings and not has_rollups:
+            return self.rebuild(db)
+        return 0
+
+
+# Singleton instance
+glucose_rollups = GlucoseRollupService()
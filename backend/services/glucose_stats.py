@@ -0,0 +1,269 @@
+import threading
+from bisect import insort
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import GlucoseRollup
+from queries import latest_values
+from services.glucose_rollups import DAILY, FIVE_MINUTES, bucket_floor
+
+
+class _RunningStats:
+    """Welford mean/variance plus glucose band counters."""
+
+    __slots__ = ("count", "mean", "m2", "hypo", "in_range", "hyper")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.hypo = 0
+        self.in_range = 0
+        self.hyper = 0
+
+    def push(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < 70:
+            self.hypo += 1
+        elif value > 180:
+            self.hyper += 1
+        else:
+            self.in_range += 1
+
+    def merge(self, other: "_RunningStats") -> None:
+        """Chan et al. parallel combination of two partial results."""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.hypo += other.hypo
+        self.in_range += other.in_range
+        self.hyper += other.hyper
+
+    def remove(self, other: "_RunningStats") -> None:
+        """Inverse of merge, used when a bucket leaves the window."""
+        remaining = self.count - other.count
+        if remaining <= 0:
+            self.__init__()
+            return
+        mean = (self.count * self.mean - other.count * other.mean) / remaining
+        delta = other.mean - mean
+        self.m2 = max(self.m2 - other.m2 - delta * delta * remaining * other.count / self.count, 0.0)
+        self.mean = mean
+        self.count = remaining
+        self.hypo -= other.hypo
+        self.in_range -= other.in_range
+        self.hyper -= other.hyper
+
+
+class _PatientWindow:
+    """Sliding window of 5-minute buckets for one patient."""
+
+    def __init__(self):
+        self.buckets: Dict[datetime, _RunningStats] = {}
+        self.starts: List[datetime] = []  # sorted bucket starts
+        self.totals = _RunningStats()
+        self.latest_time: Optional[datetime] = None
+        self.latest_value: Optional[float] = None
+        # Readings folded in per day (daily bucket start), checked against
+        # the daily rollups to notice readings this process did not see
+        self.day_counts: Dict[datetime, int] = {}
+
+    def bucket(self, start: datetime) -> _RunningStats:
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = _RunningStats()
+            insort(self.starts, start)
+        return bucket
+
+    def evict(self, window_start: datetime) -> None:
+        while self.starts and self.starts[0] < window_start:
+            self.totals.remove(self.buckets.pop(self.starts.pop(0)))
+        first_day = bucket_floor(window_start, DAILY)
+        for day in [day for day in self.day_counts if day < first_day]:
+            del self.day_counts[day]
+
+
+class GlucoseStatsAccumulator:
+    """
+    In-process streaming statistics for the /stats dashboard call.
+
+    Keeps a 24-hour sliding window per patient made of 5-minute Welford
+    buckets (the same buckets as the 5-minute rollups), so a snapshot is
+    O(1) apart from one small version check. State is per process: it is
+    rebuilt from rollups on startup and kept current by the ingest path.
+    Readings stored by other worker processes (or backfilled) are caught by
+    comparing per-day reading counts with the daily rollups before serving;
+    a patient whose counts differ is reloaded from the rollups.
+    """
+
+    def __init__(self, window: timedelta = timedelta(days=1)):
+        self.window = window
+        self._patients: Dict[int, _PatientWindow] = {}
+        self._lock = threading.Lock()
+
+    def _window_start(self, now: datetime) -> datetime:
+        return bucket_floor(now - self.window, FIVE_MINUTES)
+
+    def add_many(self, rows: Iterable[dict]) -> None:
+        """
+        Fold newly stored readings into the running windows.
+
+        Args:
+            rows: Stored readings with user_id, value and timestamp
+        """
+        window_start = self._window_start(datetime.utcnow())
+        first_day = bucket_floor(window_start, DAILY)
+        with self._lock:
+            for row in rows:
+                timestamp, value = row["timestamp"], row["value"]
+                day = bucket_floor(timestamp, DAILY)
+                if day < first_day:
+                    continue
+
+                patient = self._patients.get(row["user_id"])
+                if patient is None:
+                    patient = self._patients[row["user_id"]] = _PatientWindow()
+                patient.day_counts[day] = patient.day_counts.get(day, 0) + 1
+
+                start = bucket_floor(timestamp, FIVE_MINUTES)
+                if start < window_start:
+                    continue
+                patient.bucket(start).push(value)
+                patient.totals.push(value)
+                if patient.latest_time is None or timestamp >= patient.latest_time:
+                    patient.latest_time = timestamp
+                    patient.latest_value = value
+
+    def snapshot(self, db: Session, user_id: int) -> Optional[dict]:
+        """
+        Current 24-hour statistics for a patient.
+
+        Args:
+            db: Database session, for the daily rollup check (and a reload
+                if this process missed readings)
+            user_id: Patient id
+
+        Returns:
+            Dict with count, mean, std_dev, time_in_range and current_value,
+            or None if the patient has no readings in the window
+        """
+        window_start = self._window_start(datetime.utcnow())
+        stored = {
+            row.bucket_start: row.count
+            for row in db.execute(
+                select(GlucoseRollup.bucket_start, GlucoseRollup.count).where(
+                    GlucoseRollup.user_id == user_id,
+                    GlucoseRollup.resolution == DAILY,
+                    GlucoseRollup.bucket_start >= bucket_floor(window_start, DAILY)
+                )
+            )
+            if row.count
+        }
+
+        with self._lock:
+            patient = self._patients.get(user_id)
+            if patient is not None:
+                patient.evict(window_start)
+            current = (patient.day_counts if patient else {}) == stored
+        if not current:
+            reloaded = self._load(db, window_start, user_id).get(user_id)
+            with self._lock:
+                if reloaded is None:
+                    self._patients.pop(user_id, None)
+                else:
+                    self._patients[user_id] = reloaded
+
+        with self._lock:
+            patient = self._patients.get(user_id)
+            if patient is None:
+                return None
+
+            totals = patient.totals
+            if not totals.count:
+                if not patient.day_counts:
+                    del self._patients[user_id]
+                return None
+
+            return {
+                "count": totals.count,
+                "mean": totals.mean,
+                "std_dev": (totals.m2 / totals.count) ** 0.5,
+                "time_in_range": totals.in_range / totals.count * 100,
+                "hypo_events": totals.hypo,
+                "hyper_events": totals.hyper,
+                "current_value": patient.latest_value,
+            }
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Reload every patient's window from the 5-minute rollups.
+
+        Returns:
+            Number of patients loaded
+        """
+        patients = self._load(db, self._window_start(datetime.utcnow()))
+        with self._lock:
+            self._patients = patients
+        return len(patients)
+
+    def _load(self, db: Session, window_start: datetime,
+              user_id: Optional[int] = None) -> Dict[int, _PatientWindow]:
+        """Windows of every patient (or one) from the rollups."""
+        query = db.query(GlucoseRollup).filter(
+            GlucoseRollup.resolution == FIVE_MINUTES,
+            GlucoseRollup.bucket_start >= window_start
+        )
+        days = db.query(GlucoseRollup).filter(
+            GlucoseRollup.resolution == DAILY,
+            GlucoseRollup.bucket_start >= bucket_floor(window_start, DAILY)
+        )
+        if user_id is not None:
+            query = query.filter(GlucoseRollup.user_id == user_id)
+            days = days.filter(GlucoseRollup.user_id == user_id)
+        rollups = query.order_by(GlucoseRollup.bucket_start).all()
+
+        patients: Dict[int, _PatientWindow] = {}
+        for rollup in rollups:
+            bucket = _RunningStats()
+            bucket.count = rollup.count
+            bucket.mean = rollup.total / rollup.count
+            bucket.m2 = max(rollup.total_sq - rollup.total * bucket.mean, 0.0)
+            bucket.hypo = rollup.hypo_count
+            bucket.in_range = rollup.in_range_count
+            bucket.hyper = rollup.hyper_count
+
+            patient = patients.get(rollup.user_id)
+            if patient is None:
+                patient = patients[rollup.user_id] = _PatientWindow()
+            patient.buckets[rollup.bucket_start] = bucket
+            patient.starts.append(rollup.bucket_start)
+            patient.totals.merge(bucket)
+
+        for rollup in days:
+            if rollup.count:
+                patient = patients.get(rollup.user_id)
+                if patient is None:
+                    patient = patients[rollup.user_id] = _PatientWindow()
+                patient.day_counts[rollup.bucket_start] = rollup.count
+
+        # Latest value per patient from the (user_id, timestamp DESC) index
+        for patient_id, patient in patients.items():
+            latest = db.execute(latest_values(patient_id, 1)).first()
+            if latest:
+                patient.latest_time, patient.latest_value = latest.timestamp, latest.value
+
+        return patients
+
+
+# Singleton instance
+glucose_stats = GlucoseStatsAccumulator()
@@ -0,0 +1,118 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import IdempotencyKey
+
+
+class IdempotencyStore:
+    """
+    Service for replaying responses of retried POST requests.
+    A client sends the same Idempotency-Key header on every retry; the
+    first response is stored and returned verbatim for later attempts.
+    """
+
+    def __init__(self, ttl_hours: int = settings.IDEMPOTENCY_KEY_TTL_HOURS):
+        self.ttl = timedelta(hours=ttl_hours)
+
+    @staticmethod
+    def fingerprint(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def lookup(self, db: Session, key: str, scope: str,
+               request_hash: str) -> Optional[Tuple[int, str]]:
+        """
+        Find the stored response for a key.
+
+        Args:
+            db: Database session
+            key: Idempotency-Key header value
+            scope: Endpoint path the key was used on
+            request_hash: Fingerprint of the current request body
+
+        Returns:
+            Tuple of (status_code, response_body), or None if the key is new
+        """
+        record = db.get(IdempotencyKey, (key, scope))
+        if record is None or record.created_at < datetime.utcnow() - self.ttl:
+            return None
+        if record.request_hash != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request body"
+            )
+        return record.status_code, record.response_body
+
+    def save(self, db: Session, key: str, scope: str, request_hash: str,
+             status_code: int, response_body: str) -> Tuple[int, str]:
+        """
+        Store the response for a key unless one is already stored, so a
+        concurrent first writer wins (expired keys are replaced).
+
+        Returns:
+            Tuple of (status_code, response_body) now stored for the key,
+            another request's if it stored first
+        """
+        now = datetime.utcnow()
+        row = {
+            "key": key,
+            "scope": scope,
+            "request_hash": request_hash,
+            "status_code": status_code,
+            "response_body": response_body,
+            "created_at": now,
+        }
+        expired = IdempotencyKey.created_at < now - self.ttl
+        dialect = db.bind.dialect.name
+
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+
+            stmt = insert(IdempotencyKey).values(**row)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[IdempotencyKey.key, IdempotencyKey.scope],
+                set_={name: stmt.excluded[name] for name in row if name not in ("key", "scope")},
+                where=expired
+            ))
+            db.commit()
+        else:
+            db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.key == key, IdempotencyKey.scope == scope, expired
+            ))
+            db.add(IdempotencyKey(**row))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+
+        stored = db.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_body)
+            .where(IdempotencyKey.key == key, IdempotencyKey.scope == scope)
+        ).one()
+        if stored.request_hash != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request body"
+            )
+        return stored.status_code, stored.response_body
+
+    def purge_expired(self, db: Session) -> int:
+        """Delete keys older than the retention window."""
+        removed = db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - self.ttl)
+        ).rowcount
+        db.commit()
+        return removed
+
+
+# Singleton instance
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from typing import Dict, List, Set, Tuple
+
+
+class LiveUpdateBroker:
+    """
+    In-process publish/subscribe for per-patient live events.
+
+    Each connected client owns a bounded asyncio queue. Publishing is safe
+    from any thread (the ingest path also runs in import workers), and a
+    slow client drops its oldest events instead of blocking ingest.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Register a client queue for a patient (call from the event loop)."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    def publish(self, user_id: int, events: List[Tuple[str, str]]) -> None:
+        """
+        Deliver events to every client of a patient.
+
+        Args:
+            user_id: Patient id
+            events: (event name, JSON payload) pairs, in order
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, events)
+            except RuntimeError:
+                pass  # loop already closed; the stream cleans itself up
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, events: List[Tuple[str, str]]) -> None:
+        for event in events:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+# Singleton instance
+live_updates = LiveUpdateBroker()
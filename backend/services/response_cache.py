@@ -0,0 +1,155 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence, Union
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+from config import settings
+
+# Cache scope of cross-patient endpoints (clinician triage)
+PANEL = "panel"
+
+Scope = Union[int, str]
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: str, body: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+
+class RedisCacheBackend:
+    """
+    Redis-backed cache shared by every API process, so a write handled by
+    one worker invalidates entries cached by the others.
+    Requires the redis package (pip install redis).
+    """
+
+    def __init__(self, url: str, prefix: str = "dia-pilot:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the redis package (pip install redis)")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, body: bytes, ttl: float) -> None:
+        self._client.set(self.prefix + key, body, px=int(ttl * 1000))
+
+    def counter(self, name: str) -> int:
+        return int(self._client.get(self.prefix + name) or 0)
+
+    def incr(self, name: str) -> None:
+        self._client.incr(self.prefix + name)
+
+
+class ResponseCache:
+    """
+    Cache of serialized dashboard responses, keyed by endpoint and patient.
+
+    Each patient (and the clinician panel) has a generation counter that is
+    part of every key. Writes bump the counter, so all of that patient's
+    entries miss from then on and age out of the LRU; the TTL bounds how
+    stale time-dependent responses (predictions, crash guard) can get.
+    """
+
+    def __init__(self, backend=None, ttl: float = settings.RESPONSE_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _key(self, endpoint: str, scope: Scope, params: str) -> str:
+        generation = self.backend.counter(f"generation:{scope}")
+        return f"response:{endpoint}:{scope}:{generation}:{params}"
+
+    def cached(self, endpoint: str, scope: Optional[Scope] = None, params: Sequence[str] = ()):
+        """
+        Decorator caching a route's JSON response.
+
+        Args:
+            endpoint: Endpoint name used in the cache key
+            scope: Fixed scope such as PANEL; defaults to the route's
+                user_id argument
+            params: Other route arguments that change the response
+        """
+        def decorate(route):
+            @functools.wraps(route)
+            async def wrapper(**kwargs):
+                if self.backend is None:
+                    return await route(**kwargs)
+
+                # Keyed before computing, so a write landing meanwhile
+                # leaves this result under the old generation
+                key = self._key(
+                    endpoint,
+                    kwargs["user_id"] if scope is None else scope,
+                    repr([kwargs[name] for name in params])
+                )
+                body = self.backend.get(key)
+                if body is not None:
+                    return Response(content=body, media_type="application/json")
+
+                content = await route(**kwargs)
+                response = content if isinstance(content, Response) else ORJSONResponse(jsonable_encoder(content))
+                if response.status_code == 200:
+                    self.backend.set(key, response.body, self.ttl)
+                return response
+            return wrapper
+        return decorate
+
+    def invalidate(self, scopes: Iterable[Scope]) -> None:
+        """Drop cached responses of these patients (or PANEL) after a write."""
+        if self.backend is None:
+            return
+        for scope in set(scopes):
+            self.backend.incr(f"generation:{scope}")
+
+
+def create_backend():
+    """Cache backend selected by RESPONSE_CACHE_BACKEND (memory, redis or off)."""
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(settings.RESPONSE_CACHE_SIZE)
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.RESPONSE_CACHE_URL)
+    return None
+
+
+# Singleton instance
+response_cache = ResponseCache(create_backend())
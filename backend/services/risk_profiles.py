@@ -0,0 +1,179 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import exists, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import GlucoseReading, PatientRiskProfile
+from queries import latest_values
+from services.glucose_rollups import glucose_rollups
+from services.response_cache import PANEL, response_cache
+
+# Readings fitted for the trend slope (the newest within the trend window)
+TREND_MAX_READINGS = 12
+# mg/dL per minute beyond which the trend is rising/falling (CGM arrow scale)
+TREND_SLOPE_THRESHOLD = 1.0
+
+
+def trend_slope(timestamps: List[datetime], values: List[float]) -> Optional[float]:
+    """
+    Least-squares slope of glucose over time.
+
+    Returns:
+        Slope in mg/dL per minute, or None with fewer than 3 readings
+    """
+    if len(values) < 3:
+        return None
+    minutes = np.array([(ts - timestamps[0]).total_seconds() / 60 for ts in timestamps])
+    y = np.asarray(values, dtype=float)
+    dt = minutes - minutes.mean()
+    denom = float(dt @ dt)
+    if denom == 0:
+        return None
+    return float(dt @ (y - y.mean())) / denom
+
+
+def classify_trend(slope: Optional[float]) -> str:
+    if slope is None or abs(slope) < TREND_SLOPE_THRESHOLD:
+        return "stable"
+    return "rising" if slope > 0 else "falling"
+
+
+def classify_risk(stats: dict) -> str:
+    """
+    Risk level from window statistics, using the consensus CGM targets:
+    time in range above 70% and time below 70 mg/dL under 4%.
+    """
+    time_below = stats["hypo_events"] / stats["count"] * 100
+    if time_below >= 4 or stats["time_in_range"] < 50:
+        return "high"
+    if time_below >= 1 or stats["time_in_range"] < 70:
+        return "medium"
+    return "low"
+
+
+class RiskProfileUpdater:
+    """
+    Service for keeping PatientRiskProfile in step with glucose readings.
+    The ingest path marks patients whose readings changed; each run takes
+    the marked patients (every patient with readings on the first run after
+    startup), derives
+    avg_glucose, time_in_range and risk_level from their rollups and trend
+    from a linear fit of their latest readings, and writes the profiles
+    back in batched UPDATEs. Patients without a profile are skipped.
+    """
+
+    def __init__(self, window_days: int = settings.RISK_PROFILE_WINDOW_DAYS,
+                 trend_minutes: int = settings.RISK_TREND_WINDOW_MINUTES,
+                 batch_size: int = settings.RISK_PROFILE_BATCH_SIZE):
+        self.window = timedelta(days=window_days)
+        self.trend_window = timedelta(minutes=trend_minutes)
+        self.batch_size = batch_size
+        self._changed: Set[int] = set()  # patients with readings since their last update
+        self._caught_up = False  # set after the first full run of this process
+        self._changed_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def mark_changed(self, user_ids: Iterable[int]) -> None:
+        """Queue patients whose readings were just stored for the next run."""
+        with self._changed_lock:
+            self._changed.update(user_ids)
+
+    def _take_changed(self) -> Set[int]:
+        with self._changed_lock:
+            user_ids, self._changed = self._changed, set()
+        return user_ids
+
+    def users_with_readings(self, db: Session) -> List[int]:
+        """Patients with a profile and at least one reading (one index seek each)."""
+        return list(db.scalars(
+            select(PatientRiskProfile.user_id)
+            .where(exists().where(GlucoseReading.user_id == PatientRiskProfile.user_id))
+        ).all())
+
+    def _trend(self, db: Session, user_id: int) -> Tuple[Optional[datetime], str]:
+        """Latest reading time and trend for one patient."""
+        rows = db.execute(latest_values(user_id, TREND_MAX_READINGS)).all()
+        if not rows:
+            return None, "stable"
+        newest = rows[0].timestamp
+        recent = [row for row in reversed(rows) if row.timestamp >= newest - self.trend_window]
+        slope = trend_slope([row.timestamp for row in recent], [row.value for row in recent])
+        return newest, classify_trend(slope)
+
+    def update_batch(self, db: Session, user_ids: List[int], now: Optional[datetime] = None) -> int:
+        """
+        Recompute and store the profiles of a batch of patients.
+
+        Returns:
+            Number of profiles updated
+        """
+        now = now or datetime.utcnow()
+        profile_ids: Dict[int, int] = dict(db.execute(
+            select(PatientRiskProfile.user_id, PatientRiskProfile.id)
+            .where(PatientRiskProfile.user_id.in_(user_ids))
+        ).all())
+        if not profile_ids:
+            return 0
+
+        stats_by_user = glucose_rollups.window_stats_by_user(db, list(profile_ids), now - self.window, now)
+
+        updates = []
+        for user_id, profile_id in profile_ids.items():
+            last_reading_time, trend = self._trend(db, user_id)
+            values = {
+                "id": profile_id,
+                "last_reading_time": last_reading_time,
+                "trend": trend,
+                "updated_at": now,
+            }
+            stats = stats_by_user.get(user_id)
+            if stats:
+                values.update(
+                    avg_glucose=round(stats["mean"], 1),
+                    time_in_range=round(stats["time_in_range"], 1),
+                    risk_level=classify_risk(stats),
+                )
+            updates.append(values)
+
+        # Grouped by key set, since an executemany UPDATE needs uniform rows
+        by_keys: Dict[tuple, List[dict]] = {}
+        for values in updates:
+            by_keys.setdefault(tuple(values), []).append(values)
+        for rows in by_keys.values():
+            db.execute(update(PatientRiskProfile), rows)
+        db.commit()
+        response_cache.invalidate([PANEL])
+        return len(updates)
+
+    def run(self, db: Session) -> int:
+        """
+        Update the profiles of every patient with new readings.
+
+        Returns:
+            Number of profiles updated
+        """
+        with self._lock:
+            changed = self._take_changed()
+            if not self._caught_up:
+                # Readings stored before this process started were never marked
+                changed.update(self.users_with_readings(db))
+            user_ids = sorted(changed)
+
+            updated = 0
+            try:
+                for i in range(0, len(user_ids), self.batch_size):
+                    updated += self.update_batch(db, user_ids[i:i + self.batch_size])
+            except Exception:
+                db.rollback()
+                self.mark_changed(user_ids[i:])
+                raise
+            self._caught_up = True
+            return updated
+
+
+# Singleton instance
+risk_profiles = RiskProfileUpdater()
@@ -0,0 +1,117 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from config import settings
+from database import async_engine
+
+
+class WriteBehindQueue:
+    """
+    Group-commit queue for append-only log inserts (voice, meal, diagnosis).
+
+    Requests enqueue rows instead of committing themselves; one flusher
+    task collects them until MAX_BATCH rows or MAX_DELAY has passed and
+    writes each batch in a single transaction, so concurrent requests
+    share one commit (and one fsync).
+    """
+
+    def __init__(self, max_batch: int = settings.WRITE_BEHIND_MAX_BATCH,
+                 max_delay_ms: int = settings.WRITE_BEHIND_MAX_DELAY_MS,
+                 mode: str = settings.WRITE_BEHIND_MODE):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.wait_for_flush = mode != "fire_and_forget"
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the flusher on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_batch * 50)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then stop the flusher."""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+
+    async def submit(self, model, values: dict, wait: Optional[bool] = None) -> Optional[int]:
+        """
+        Queue one row for insertion.
+
+        Args:
+            model: ORM model class
+            values: Column values for the new row
+            wait: Wait for the batch to commit (default: WRITE_BEHIND_MODE)
+
+        Returns:
+            The new row id when waiting, otherwise None
+        """
+        self.start()
+        wait = self.wait_for_flush if wait is None else wait
+        future = asyncio.get_running_loop().create_future() if wait else None
+        await self._queue.put((model, values, future))
+        return await future if future else None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple]) -> None:
+        """Insert one batch in a single transaction and resolve its waiters."""
+        by_model: Dict[type, List[Tuple[dict, Optional[asyncio.Future]]]] = {}
+        for model, values, future in batch:
+            by_model.setdefault(model, []).append((values, future))
+
+        resolved = []
+        try:
+            async with async_engine.begin() as conn:
+                for model, items in by_model.items():
+                    result = await conn.execute(
+                        insert(model).returning(model.id, sort_by_parameter_order=True),
+                        [values for values, _ in items]
+                    )
+                    resolved.extend(zip((future for _, future in items), result.scalars().all()))
+        except Exception as e:
+            for _, _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            if any(future is None for _, _, future in batch):
+                print(f"Error writing {len(batch)} queued log rows: {e}")
+            return
+
+        for future, row_id in resolved:
+            if future is not None and not future.done():
+                future.set_result(row_id)
+
+
+# Singleton instance
+write_behind = WriteBehindQueue()
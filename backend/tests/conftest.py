@@ -0,0 +1,62 @@
+"""
+Shared fixtures. Settings are read from the environment at import time, so
+the app is pointed at a throwaway SQLite database and archive before any
+backend module is imported.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmp = tempfile.mkdtemp(prefix="dia-pilot-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    "READ_DATABASE_URL": "",
+    "UPLOAD_DIR": os.path.join(_tmp, "uploads"),
+    "IMPORT_DIR": os.path.join(_tmp, "imports"),
+    "ARCHIVE_DIR": os.path.join(_tmp, "archive"),
+    "ARCHIVE_AFTER_DAYS": "0",  # tests archive explicitly
+    "RESPONSE_CACHE_BACKEND": "off",
+})
+
+_user_ids = itertools.count(1000)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from database import init_db
+
+    init_db()
+
+
+@pytest.fixture
+def db():
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    """API client; startup (rollup and forecast backfills, workers) runs once."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user_id():
+    """A patient id no other test has written readings for."""
+    return next(_user_ids)
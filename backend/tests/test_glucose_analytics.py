@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from services.glucose_analytics import AGP_PERCENTILES, glucose_analytics
+
+FIVE_MINUTES_MS = 5 * 60 * 1000
+
+
+def test_lttb_keeps_endpoints_and_returns_sorted_indices():
+    x = np.arange(1000) * FIVE_MINUTES_MS
+    y = 120 + 40 * np.sin(np.arange(1000) / 30)
+
+    selected = glucose_analytics.lttb(x, y, 100)
+
+    assert len(selected) == 100
+    assert selected[0] == 0 and selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_a_lone_spike():
+    x = np.arange(500) * FIVE_MINUTES_MS
+    y = np.full(500, 110.0)
+    y[237] = 45.0
+
+    assert 237 in glucose_analytics.lttb(x, y, 50)
+
+
+def test_lttb_returns_everything_when_under_the_limit():
+    x = np.arange(20) * FIVE_MINUTES_MS
+
+    assert list(glucose_analytics.lttb(x, x.astype(float), 50)) == list(range(20))
+
+
+def test_agp_bands_match_numpy_percentiles():
+    rng = np.random.default_rng(7)
+    timestamps = np.arange(14 * 288) * FIVE_MINUTES_MS
+    values = rng.normal(140, 45, size=len(timestamps)).clip(40, 400).round(1)
+
+    agp = glucose_analytics.compute_agp(timestamps, values, 60)
+
+    assert agp["readings"] == len(values)
+    assert len(agp["bands"]) == 24
+    assert sum(band["count"] for band in agp["bands"]) == len(values)
+    hours = (timestamps // 60000) % 1440 // 60
+    for band in agp["bands"]:
+        in_bin = values[hours == band["minute"] // 60]
+        for p in AGP_PERCENTILES:
+            assert band[f"p{p}"] == pytest.approx(np.percentile(in_bin, p), abs=0.06)
+    assert agp["mean_glucose"] == pytest.approx(values.mean(), abs=0.06)
+    assert agp["time_in_range"] == pytest.approx(
+        np.count_nonzero((values >= 70) & (values <= 180)) / len(values) * 100, abs=0.06
+    )
+    assert agp["time_below_range"] == pytest.approx(
+        np.count_nonzero(values < 70) / len(values) * 100, abs=0.06
+    )
+
+
+def test_agp_leaves_empty_bins_blank():
+    timestamps = np.arange(12) * FIVE_MINUTES_MS  # first hour only
+    values = np.full(12, 100.0)
+
+    bands = glucose_analytics.compute_agp(timestamps, values, 60)["bands"]
+
+    assert bands[0]["p50"] == 100.0
+    assert all(band["count"] == 0 and band["p50"] is None for band in bands[1:])
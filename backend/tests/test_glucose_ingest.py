@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+from models import GlucoseReading
+from schemas import GlucoseReadingCreate
+from services.glucose_archive import glucose_archive
+from services.glucose_ingest import glucose_ingestor
+
+
+def _reading(user_id, timestamp, value=120.0, source="cgm"):
+    return GlucoseReadingCreate(user_id=user_id, value=value, timestamp=timestamp, source=source)
+
+
+def _stored(db, user_id):
+    return db.query(GlucoseReading).filter(GlucoseReading.user_id == user_id).count()
+
+
+def test_repeats_in_a_batch_collapse_onto_the_first(db, user_id):
+    ts = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=10)
+
+    rows = glucose_ingestor.ingest(db, [
+        _reading(user_id, ts, 120.0),
+        _reading(user_id, ts, 125.0),
+        _reading(user_id, ts + timedelta(minutes=5), 130.0),
+    ])
+
+    assert [row["duplicate"] for row in rows] == [False, True, False]
+    assert rows[1]["id"] == rows[0]["id"]
+    assert _stored(db, user_id) == 2
+
+
+def test_resent_reading_is_a_duplicate(db, user_id):
+    ts = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=10)
+    first, = glucose_ingestor.ingest(db, [_reading(user_id, ts)])
+
+    # Same instant with an offset, and the same instant from another source
+    aware = ts.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=2)))
+    again, other_source = glucose_ingestor.ingest(db, [
+        _reading(user_id, aware),
+        _reading(user_id, ts, source="manual"),
+    ])
+
+    assert again["duplicate"] and again["id"] == first["id"]
+    assert not other_source["duplicate"]
+    assert _stored(db, user_id) == 2
+
+
+def test_resent_reading_already_archived_is_a_duplicate(db, user_id):
+    ts = datetime.utcnow().replace(microsecond=0) - timedelta(days=30)
+    first, = glucose_ingestor.ingest(db, [_reading(user_id, ts)], publish=False)
+    glucose_archive.archive_older_than(db, ts + timedelta(days=1))
+    assert _stored(db, user_id) == 0
+
+    again, = glucose_ingestor.ingest(db, [_reading(user_id, ts)], publish=False)
+
+    assert again["duplicate"] and again["id"] == first["id"]
+    assert _stored(db, user_id) == 0
+
+
+def _batch(user_id, value=120.0):
+    ts = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=10)
+    return [{"user_id": user_id, "value": value, "timestamp": ts.isoformat(), "source": "cgm"}]
+
+
+def test_idempotency_key_replays_the_first_response(client, user_id):
+    headers = {"Idempotency-Key": f"batch-{user_id}"}
+    body = _batch(user_id)
+
+    first = client.post("/api/glucose/readings/batch", json=body, headers=headers)
+    replay = client.post("/api/glucose/readings/batch", json=body, headers=headers)
+
+    assert first.status_code == replay.status_code == 200
+    assert first.json()["created"] == 1
+    assert replay.headers.get("Idempotent-Replayed") == "true"
+    assert replay.json() == first.json()
+
+
+def test_idempotency_key_reused_with_another_body_is_rejected(client, user_id):
+    headers = {"Idempotency-Key": f"batch-{user_id}"}
+
+    client.post("/api/glucose/readings/batch", json=_batch(user_id), headers=headers)
+    reused = client.post("/api/glucose/readings/batch", json=_batch(user_id, 180.0), headers=headers)
+
+    assert reused.status_code == 422
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from schemas import GlucoseReadingCreate
+from services.glucose_ingest import glucose_ingestor
+from services.glucose_predictor import RESET_GAP_MINUTES, _ForecastState, glucose_predictor
+
+T0 = datetime(2024, 3, 10, 8, 0)
+
+
+def _ramp(slope, steps=24, start=180.0):
+    state = _ForecastState(T0, start)
+    for i in range(1, steps + 1):
+        state.push(T0 + timedelta(minutes=5 * i), start + slope * 5 * i)
+    return state
+
+
+def test_filter_follows_a_steady_trend():
+    state = _ramp(-1.5)
+
+    assert state.trend == pytest.approx(-1.5, abs=0.05)
+    assert state.level == pytest.approx(180.0 - 1.5 * 120, abs=1.0)
+
+
+def test_filter_ignores_readings_that_are_not_newer():
+    state = _ramp(-1.5)
+    level, trend = state.level, state.trend
+
+    assert not state.push(state.last_time, 200.0)
+    assert not state.push(state.last_time - timedelta(minutes=5), 200.0)
+    assert (state.level, state.trend) == (level, trend)
+
+
+def test_filter_restarts_after_a_gap():
+    state = _ramp(-1.5)
+    later = state.last_time + timedelta(minutes=RESET_GAP_MINUTES)
+
+    assert state.push(later, 150.0)
+    assert (state.level, state.trend, state.last_value) == (150.0, 0.0, 150.0)
+
+
+@pytest.mark.parametrize("current, level, trend, risk, estimate", [
+    (66.0, 95.0, 0.0, "high", "Now"),  # raw reading low, filter still high
+    (100.0, 100.0, -2.0, "high", "~20 min"),
+    (120.0, 120.0, -3.0, "medium", "~25 min"),
+    (75.0, 75.0, 0.0, "medium", "~45-60 min"),
+    (120.0, 120.0, -0.5, "low", None),  # damped trend never reaches 70
+    (120.0, 120.0, 0.0, "low", None),
+])
+def test_hypo_risk_thresholds(current, level, trend, risk, estimate):
+    assert glucose_predictor.check_hypo_risk(current, level, trend)[:2] == (risk, estimate)
+
+
+def _ingest(db, user_id, values, last_minutes_ago=0):
+    now = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=last_minutes_ago)
+    glucose_ingestor.ingest(db, [
+        GlucoseReadingCreate(
+            user_id=user_id, value=v, source="cgm",
+            timestamp=now - timedelta(minutes=5 * (len(values) - 1 - i))
+        )
+        for i, v in enumerate(values)
+    ], publish=False)
+
+
+def test_crash_guard_flags_a_low_raw_reading(client, db, user_id):
+    _ingest(db, user_id, [100.0, 110.0, 120.0, 130.0, 66.0])
+
+    alert = client.get("/api/glucose/crash-guard", params={"user_id": user_id}).json()
+    predictions = client.get("/api/glucose/predictions", params={"user_id": user_id}).json()
+
+    assert alert["risk_level"] == "high"
+    assert alert["estimated_time"] == "Now"
+    assert alert["current_glucose"] == 66.0
+    assert predictions[0] == {"time": "Now", "value": 66.0, "predicted": False}
+    assert predictions[1]["time"] == "+30m"
+    assert predictions[1]["value"] == pytest.approx(alert["predicted_glucose"], abs=0.1)
+
+
+def test_crash_guard_does_not_forecast_from_a_stale_reading(client, db, user_id):
+    _ingest(db, user_id, [65.0], last_minutes_ago=RESET_GAP_MINUTES + 15)
+
+    alert = client.get("/api/glucose/crash-guard", params={"user_id": user_id}).json()
+    predictions = client.get("/api/glucose/predictions", params={"user_id": user_id}).json()
+
+    assert alert["risk_level"] == "unknown"
+    assert alert["predicted_glucose"] is None
+    assert alert["current_glucose"] == 65.0
+    assert alert["reading_age_minutes"] == RESET_GAP_MINUTES + 15
+    assert alert["recommendations"][0].startswith("Last reading was below 70")
+    assert predictions == [{"time": f"-{RESET_GAP_MINUTES + 15}m", "value": 65.0, "predicted": False}]
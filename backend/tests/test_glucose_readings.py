@@ -0,0 +1,54 @@
+import json
+from datetime import datetime, timedelta
+
+from schemas import GlucoseReadingCreate
+from services.glucose_archive import glucose_archive
+from services.glucose_ingest import glucose_ingestor
+
+
+def _ingest(db, user_id, timestamps):
+    readings = [
+        GlucoseReadingCreate(user_id=user_id, value=100.0 + i % 50, timestamp=ts, source="cgm")
+        for i, ts in enumerate(timestamps)
+    ]
+    return glucose_ingestor.ingest(db, readings, publish=False)
+
+
+def _walk(client, user_id, limit):
+    seen, cursor = [], None
+    while True:
+        params = {"user_id": user_id, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/glucose/readings", params=params).json()
+        seen.extend((datetime.fromisoformat(r["timestamp"]), r["id"]) for r in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_cursor_walk_continues_into_the_archive(client, db, user_id):
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    old = [now - timedelta(days=10, minutes=5 * i) for i in range(30)]
+    recent = [now - timedelta(minutes=5 * i) for i in range(12)]
+    stored = _ingest(db, user_id, old + recent)
+    glucose_archive.archive_older_than(db, now - timedelta(days=3))
+
+    seen = _walk(client, user_id, limit=7)
+
+    expected = sorted(((row["timestamp"], row["id"]) for row in stored), reverse=True)
+    assert seen == expected
+
+
+def test_export_interleaves_late_backfill_with_archive(client, db, user_id):
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    _ingest(db, user_id, [now - timedelta(days=10, minutes=5 * i) for i in range(6)])
+    glucose_archive.archive_older_than(db, now - timedelta(days=3))
+    # Backfilled after archiving: hot rows older than archived ones
+    _ingest(db, user_id, [now - timedelta(days=12, minutes=5 * i) for i in range(3)])
+
+    response = client.get("/api/export/glucose", params={"user_id": user_id, "format": "ndjson"})
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 9
+    assert [r["timestamp"] for r in rows] == sorted(r["timestamp"] for r in rows)
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from schemas import GlucoseReadingCreate
+from services.glucose_ingest import glucose_ingestor
+from services.glucose_rollups import (
+    DAILY, FIVE_MINUTES, HOURLY, bucket_floor, glucose_rollups
+)
+
+BASE = datetime(2024, 3, 10, 0, 0)
+
+WINDOWS = [
+    (BASE + timedelta(minutes=5), BASE + timedelta(minutes=40)),  # inside one hour
+    (BASE + timedelta(hours=1, minutes=35), BASE + timedelta(hours=9, minutes=10)),  # across hours
+    (BASE + timedelta(hours=13, minutes=25), BASE + timedelta(days=3, hours=2, minutes=55)),  # across days
+    (BASE + timedelta(days=1), BASE + timedelta(days=3)),  # whole days
+]
+
+
+@pytest.mark.parametrize("since, until", WINDOWS)
+def test_window_ranges_tile_the_window(since, until):
+    ranges = glucose_rollups._window_ranges(since, until)
+
+    assert ranges[0][1] == bucket_floor(since, FIVE_MINUTES)
+    assert ranges[-1][2] == until
+    for (_, _, end), (_, start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    for resolution, start, end in ranges:
+        assert bucket_floor(start, resolution) == start
+        if resolution in (HOURLY, DAILY):
+            assert bucket_floor(end, resolution) == end
+    # Coarsest buckets in the middle
+    resolutions = [r[0] for r in ranges]
+    peak = resolutions.index(max(resolutions))
+    assert resolutions[:peak + 1] == sorted(resolutions[:peak + 1])
+    assert resolutions[peak:] == sorted(resolutions[peak:], reverse=True)
+
+
+def test_whole_days_are_read_from_daily_rollups():
+    ranges = glucose_rollups._window_ranges(BASE + timedelta(days=1), BASE + timedelta(days=3))
+
+    assert ranges == [(DAILY, BASE + timedelta(days=1), BASE + timedelta(days=3))]
+
+
+@pytest.mark.parametrize("since, until", WINDOWS)
+def test_window_stats_match_the_raw_readings(db, user_id, since, until):
+    rng = np.random.default_rng(user_id)
+    timestamps = [BASE - timedelta(hours=2) + timedelta(minutes=7 * i) for i in range(1000)]
+    values = rng.uniform(45, 260, size=len(timestamps)).round(1)
+    glucose_ingestor.ingest(db, [
+        GlucoseReadingCreate(user_id=user_id, value=float(v), timestamp=ts, source="cgm")
+        for ts, v in zip(timestamps, values)
+    ], publish=False)
+
+    stats = glucose_rollups.window_stats(db, user_id, since, until)
+
+    inside = np.array([v for ts, v in zip(timestamps, values) if since <= ts < until])
+    assert stats["count"] == len(inside)
+    assert stats["mean"] == pytest.approx(inside.mean())
+    assert stats["std_dev"] == pytest.approx(inside.std(), rel=1e-6)
+    assert stats["min"] == inside.min()
+    assert stats["max"] == inside.max()
+    assert stats["hypo_events"] == np.count_nonzero(inside < 70)
+    assert stats["hyper_events"] == np.count_nonzero(inside > 180)
+    assert stats["time_in_range"] == pytest.approx(
+        np.count_nonzero((inside >= 70) & (inside <= 180)) / len(inside) * 100
+    )
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from schemas import GlucoseReadingCreate
+from services.glucose_ingest import glucose_ingestor
+from services.glucose_rollups import glucose_rollups
+from services.glucose_stats import glucose_stats
+
+
+def test_snapshot_tracks_ingested_readings(db, user_id):
+    now = datetime.utcnow().replace(microsecond=0)
+    values = [65.0, 120.0, 190.0]
+    glucose_ingestor.ingest(db, [
+        GlucoseReadingCreate(user_id=user_id, value=v, timestamp=now - timedelta(minutes=10 - 5 * i), source="cgm")
+        for i, v in enumerate(values)
+    ], publish=False)
+
+    stats = glucose_stats.snapshot(db, user_id)
+
+    assert stats["count"] == 3
+    assert stats["mean"] == pytest.approx(125.0)
+    assert (stats["hypo_events"], stats["hyper_events"]) == (1, 1)
+    assert stats["current_value"] == 190.0
+
+
+def test_snapshot_reloads_readings_stored_by_another_worker(db, user_id):
+    now = datetime.utcnow().replace(microsecond=0)
+    glucose_ingestor.ingest(db, [
+        GlucoseReadingCreate(user_id=user_id, value=100.0, timestamp=now - timedelta(minutes=10), source="cgm")
+    ], publish=False)
+    assert glucose_stats.snapshot(db, user_id)["count"] == 1
+
+    # Another process folds a reading into the rollups; this one never sees add_many
+    glucose_rollups.apply(db, [{"user_id": user_id, "value": 140.0, "timestamp": now - timedelta(minutes=5)}])
+    db.commit()
+
+    stats = glucose_stats.snapshot(db, user_id)
+    assert stats["count"] == 2
+    assert stats["mean"] == pytest.approx(120.0)
+
+
+def test_snapshot_is_empty_without_recent_readings(db, user_id):
+    assert glucose_stats.snapshot(db, user_id) is None
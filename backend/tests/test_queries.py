@@ -0,0 +1,8 @@
+from queries import check_index_usage
+
+
+def test_dashboard_queries_use_their_index(db):
+    results = check_index_usage(db)
+
+    unindexed = {name: plan for name, (uses_index, plan) in results.items() if not uses_index}
+    assert not unindexed
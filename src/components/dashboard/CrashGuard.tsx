@@ -32,7 +32,8 @@ export default function CrashGuard() {
     );
   }
 
-  const isRisk = alert?.risk_level === 'high' || alert?.risk_level === 'medium';
+  // 'unknown' means no CGM reading in the last hour
+  const isRisk = alert?.risk_level === 'high' || alert?.risk_level === 'medium' || alert?.risk_level === 'unknown';
 
   return (
     <Card className={`p-6 ${isRisk ? 'border-2 border-amber-400' : ''}`} hover>
@@ -57,7 +58,8 @@ export default function CrashGuard() {
           size="lg"
         >
           {alert?.risk_level === 'low' ? 'Low Risk' :
-            alert?.risk_level === 'medium' ? 'Medium Risk' : 'High Risk'}
+            alert?.risk_level === 'medium' ? 'Medium Risk' :
+              alert?.risk_level === 'unknown' ? 'No Recent Reading' : 'High Risk'}
         </Badge>
         {alert?.estimated_time && (
           <p className="text-sm text-amber-700 font-medium mt-2 mb-2">
@@ -65,7 +67,9 @@ export default function CrashGuard() {
           </p>
         )}
         <p className="text-xs text-gray-600 mt-2">
-          Current: {alert?.current_glucose} mg/dL | Predicted: {alert?.predicted_glucose} mg/dL
+          {alert?.predicted_glucose != null
+            ? `Current: ${alert?.current_glucose} mg/dL | Predicted: ${alert.predicted_glucose} mg/dL`
+            : `Last reading: ${alert?.current_glucose} mg/dL, ${alert?.reading_age_minutes} min ago`}
         </p>
       </div>
 
@@ -20,6 +20,17 @@ export interface MealLogResponse {
     created_at: string;
 }
 
+export interface Page<T> {
+    items: T[];
+    next_cursor: string | null;
+}
+
+function pageQuery(limit: number, cursor?: string | null): string {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set('cursor', cursor);
+    return params.toString();
+}
+
 // Meal APIs
 export async function uploadMealPhoto(file: File): Promise<MealAnalysisResponse> {
     const formData = new FormData();
@@ -38,8 +49,8 @@ export async function uploadMealPhoto(file: File): Promise<MealAnalysisResponse>
     return response.json();
 }
 
-export async function getMealHistory(limit: number = 10): Promise<MealLogResponse[]> {
-    const response = await fetch(`${API_BASE_URL}/meals/history?limit=${limit}`);
+export async function getMealHistory(limit: number = 10, cursor?: string | null): Promise<Page<MealLogResponse>> {
+    const response = await fetch(`${API_BASE_URL}/meals/history?${pageQuery(limit, cursor)}`);
     if (!response.ok) throw new Error('Failed to fetch meal history');
     return response.json();
 }
@@ -51,6 +62,21 @@ export async function getGlucoseStats() {
     return response.json();
 }
 
+export async function getGlucoseRange(from?: string, to?: string, maxPoints: number = 300) {
+    const params = new URLSearchParams({ max_points: String(maxPoints) });
+    if (from) params.set('from', from);
+    if (to) params.set('to', to);
+    const response = await fetch(`${API_BASE_URL}/glucose/range?${params}`);
+    if (!response.ok) throw new Error('Failed to fetch glucose range');
+    return response.json();
+}
+
+export async function getGlucoseAGP(days: number = 14) {
+    const response = await fetch(`${API_BASE_URL}/glucose/agp?days=${days}`);
+    if (!response.ok) throw new Error('Failed to fetch glucose profile');
+    return response.json();
+}
+
 export async function getGlucosePredictions() {
     const response = await fetch(`${API_BASE_URL}/glucose/predictions`);
     if (!response.ok) throw new Error('Failed to fetch predictions');
@@ -63,6 +89,18 @@ export async function getCrashGuard() {
     return response.json();
 }
 
+// Live readings and crash-guard alerts (server-sent events); returns an unsubscribe function
+export function subscribeGlucose(
+    onReading: (reading: any) => void,
+    onCrashGuard: (assessment: any) => void,
+    userId: number = 1
+) {
+    const source = new EventSource(`${API_BASE_URL}/glucose/stream?user_id=${userId}`);
+    source.addEventListener('reading', (e) => onReading(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener('crash-guard', (e) => onCrashGuard(JSON.parse((e as MessageEvent).data)));
+    return () => source.close();
+}
+
 // Predictions API
 export async function simulateGlucose(scenario: string, mealCarbs?: number, exerciseDuration?: number) {
     const response = await fetch(`${API_BASE_URL}/predictions/simulate`, {
@@ -99,8 +137,34 @@ export async function getGlucoseTwins() {
 }
 
 // Clinician APIs
-export async function getPatientTriage() {
-    const response = await fetch(`${API_BASE_URL}/clinician/triage`);
+export interface PatientRiskProfile {
+    id: number;
+    user_id: number;
+    name: string;
+    age: number;
+    risk_level: 'high' | 'medium' | 'low';
+    avg_glucose: number | null;
+    time_in_range: number | null;
+    last_reading_time: string | null;
+    trend: 'rising' | 'falling' | 'stable';
+}
+
+export interface TriageFilters {
+    riskLevels?: Array<PatientRiskProfile['risk_level']>;
+    trend?: PatientRiskProfile['trend'];
+    staleMinutes?: number;
+}
+
+export async function getPatientTriage(
+    filters: TriageFilters = {},
+    limit: number = 50,
+    cursor?: string | null
+): Promise<Page<PatientRiskProfile>> {
+    const params = new URLSearchParams(pageQuery(limit, cursor));
+    filters.riskLevels?.forEach((level) => params.append('risk_level', level));
+    if (filters.trend) params.set('trend', filters.trend);
+    if (filters.staleMinutes) params.set('stale_minutes', String(filters.staleMinutes));
+    const response = await fetch(`${API_BASE_URL}/clinician/triage?${params}`);
     if (!response.ok) throw new Error('Failed to fetch triage');
     return response.json();
 }
@@ -111,6 +175,63 @@ export async function getExecutiveSummary(patientId: number) {
     return response.json();
 }
 
+export interface PatientSummary {
+    patient_id: number;
+    patient_name: string;
+    risk_level: PatientRiskProfile['risk_level'];
+    avg_glucose: number;
+    time_in_range: number;
+    hypo_events: number;
+    hyper_events: number;
+    trend: PatientRiskProfile['trend'];
+    key_insights: string[];
+}
+
+export async function getExecutiveSummaries(
+    patientIds: number[] = [],
+    filters: TriageFilters = {},
+    limit: number = 50,
+    cursor?: string | null
+): Promise<Page<PatientSummary>> {
+    const params = new URLSearchParams(pageQuery(limit, cursor));
+    patientIds.forEach((id) => params.append('patient_id', String(id)));
+    filters.riskLevels?.forEach((level) => params.append('risk_level', level));
+    if (filters.trend) params.set('trend', filters.trend);
+    if (filters.staleMinutes) params.set('stale_minutes', String(filters.staleMinutes));
+    const response = await fetch(`${API_BASE_URL}/clinician/summaries?${params}`);
+    if (!response.ok) throw new Error('Failed to fetch summaries');
+    return response.json();
+}
+
+export interface PatientForecast {
+    user_id: number;
+    name: string;
+    risk_level: PatientRiskProfile['risk_level'];
+    current_value: number | null;
+    reading_age_minutes: number | null;
+    forecast: number[] | null;
+}
+
+export interface ForecastPage extends Page<PatientForecast> {
+    horizon_minutes: number[];
+}
+
+export async function getCohortForecasts(
+    filters: TriageFilters = {},
+    hours: number = 3,
+    limit: number = 1000,
+    cursor?: string | null
+): Promise<ForecastPage> {
+    const params = new URLSearchParams(pageQuery(limit, cursor));
+    params.set('hours', String(hours));
+    filters.riskLevels?.forEach((level) => params.append('risk_level', level));
+    if (filters.trend) params.set('trend', filters.trend);
+    if (filters.staleMinutes) params.set('stale_minutes', String(filters.staleMinutes));
+    const response = await fetch(`${API_BASE_URL}/clinician/forecasts?${params}`);
+    if (!response.ok) throw new Error('Failed to fetch forecasts');
+    return response.json();
+}
+
 // Health Profile APIs
 export async function submitHealthProfile(data: any) {
     const response = await fetch(`${API_BASE_URL}/health/profile`, {
@@ -136,8 +257,8 @@ export async function getAIDiagnosis() {
     return response.json();
 }
 
-export async function getDiagnosisHistory(limit = 5) {
-    const response = await fetch(`${API_BASE_URL}/health/diagnoses?limit=${limit}`);
+export async function getDiagnosisHistory(limit = 5, cursor?: string | null) {
+    const response = await fetch(`${API_BASE_URL}/health/diagnoses?${pageQuery(limit, cursor)}`);
     if (!response.ok) throw new Error('Failed to fetch diagnosis history');
     return response.json();
 }